@@ -0,0 +1,115 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict
+
+
+class AdjacencyCache:
+    """An LRU cache of neighbor lists read from a TuGraph read transaction.
+
+    Reading neighbors with `txn.GetVertexIterator(vid).ListDstVids()` crosses the
+    Python/C++ boundary and builds a fresh Python list on every call.
+    Traversals that revisit the same vertices (random walks, repeated searches)
+    can read through this cache instead, which keeps each neighbor list
+    as a compact, sorted `array` of vertex ids.
+
+    The memory is bounded by `max_ids`, the total number of vertex ids kept
+    in the cache. Each list is charged its length plus one id for the entry
+    itself, so empty lists (e.g., of sink vertices) count as well.
+    The least recently used lists are evicted first.
+    A cache with `max_ids=0` keeps nothing and simply reads through.
+
+    NOTE: Cached lists are only valid while the graph is not modified.
+    A cache can be re-attached to a new read transaction with `attach()`,
+    e.g., one transaction per walk, and keep its contents.
+
+    Args:
+        txn (optional): A TuGraph read transaction. Defaults to `None`,
+            in which case a transaction must be attached before use.
+        max_ids (int, optional): Maximum number of vertex ids kept in the cache.
+            Defaults to 2^22 (32 MB of ids).
+    """
+
+    def __init__(self, txn=None, max_ids: int = 1 << 22):
+        self.txn = txn
+        self.max_ids = max_ids
+
+        # (vid, is_out) -> sorted neighbor ids, in least-recently-used order
+        self._lists: "OrderedDict[tuple, array]" = OrderedDict()
+        self.n_ids = 0  # total number of ids currently charged, see `_cost`
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def attach(self, txn) -> "AdjacencyCache":
+        """Reads missing neighbor lists through `txn` from now on."""
+        self.txn = txn
+        return self
+
+    def out_neighbors(self, vid: int) -> array:
+        """Returns the sorted destination ids of the out-edges of `vid`."""
+        return self._get(vid, True)
+
+    def in_neighbors(self, vid: int) -> array:
+        """Returns the sorted source ids of the in-edges of `vid`."""
+        return self._get(vid, False)
+
+    def has_edge(self, src: int, dst: int) -> bool:
+        """Returns True if there is an edge src -> dst."""
+        nbrs = self._get(src, True)
+        idx = bisect_left(nbrs, dst)
+        return idx < len(nbrs) and nbrs[idx] == dst
+
+    def _get(self, vid: int, is_out: bool) -> array:
+        key = (vid, is_out)
+        nbrs = self._lists.get(key)
+        if nbrs is not None:
+            self.hits += 1
+            self._lists.move_to_end(key)
+            return nbrs
+
+        self.misses += 1
+        if self.txn is None:
+            raise ValueError("No transaction attached to the adjacency cache.")
+        vit = self.txn.GetVertexIterator(vid)
+        if is_out:
+            nbrs = array("q", sorted(vit.ListDstVids()[0]))
+        else:
+            nbrs = array("q", sorted(vit.ListSrcVids()[0]))
+
+        cost = self._cost(nbrs)
+        if cost <= self.max_ids:
+            self._lists[key] = nbrs
+            self.n_ids += cost
+            while self.n_ids > self.max_ids:
+                _, evicted = self._lists.popitem(last=False)
+                self.n_ids -= self._cost(evicted)
+                self.evictions += 1
+        return nbrs
+
+    @staticmethod
+    def _cost(nbrs: array) -> int:
+        """Number of ids charged for caching `nbrs`: one per neighbor,
+        plus one for the entry itself."""
+        return len(nbrs) + 1
+
+    def clear(self):
+        """Drops all cached lists. The counters are kept."""
+        self._lists.clear()
+        self.n_ids = 0
+
+    def __len__(self) -> int:
+        return len(self._lists)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters, useful for sizing `max_ids`."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "cached_lists": len(self._lists),
+            "cached_ids": self.n_ids,
+        }
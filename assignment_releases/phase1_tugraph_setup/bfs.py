@@ -1,31 +1,67 @@
-def bfs_path_search(db, src: int, dst: int):
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from adjacency_cache import AdjacencyCache
+
+
+def _trace_back(prev: Dict[int, int], node: int) -> List[int]:
+    """Follows the `prev` links from `node` until -1 and returns the visited nodes."""
+    path = []
+    while node != -1:
+        path.append(node)
+        node = prev[node]
+    return path
+
+
+def _attach_cache(txn, cache: Optional[AdjacencyCache]) -> AdjacencyCache:
+    """Attaches `cache` to `txn`, or returns a read-through cache if it is None."""
+    if cache is None:
+        cache = AdjacencyCache(max_ids=0)
+    return cache.attach(txn)
+
+
+def bfs_path_search(
+    db,
+    src: int,
+    dst: int,
+    bidirectional: bool = False,
+    cache: Optional[AdjacencyCache] = None,
+):
     """
     Finds the shortest path on a non-weighted graph
     from src to dst using breadth-first search.
+
+    If `bidirectional` is True, the search expands from both `src` and `dst`
+    and stops as soon as the two frontiers meet,
+    which usually visits far fewer vertices on large graphs.
+
+    Pass an `AdjacencyCache` as `cache` to reuse neighbor lists across searches.
+
+    Returns an empty list if dst is not reachable from src.
     """
+    if bidirectional:
+        return _bidirectional_bfs_path_search(db, src, dst, cache)
+
     # Create a read transaction to read the graph
     txn = db.CreateReadTxn()
+    adj = _attach_cache(txn, cache)
 
     # store results
     prev = {}
 
     # bfs init
-    q = []
-    q.append(src)
+    # NOTE: a deque pops from the left in O(1), unlike list.pop(0)
+    q = deque([src])
     visited = set([src])
 
     prev[src] = -1
 
-    # bfs
-    while len(q):
-        node = q.pop(0)
-        visited.add(node)
-
-        # we need a vertex iterator to access nodes
-        vit = txn.GetVertexIterator(node)
+    # bfs, stops as soon as dst is found
+    while len(q) and dst not in visited:
+        node = q.popleft()
 
-        # use ListDstVids() to get the neighbors of the node
-        nbr_list = vit.ListDstVids()[0]
+        # get the neighbors of the node, the cache uses a vertex iterator
+        # and ListDstVids() to read them from the transaction
+        nbr_list = adj.out_neighbors(node)
 
         for nbr in nbr_list:
             if nbr not in visited:
@@ -33,15 +69,122 @@ def bfs_path_search(db, src: int, dst: int):
                 prev[nbr] = node
                 q.append(nbr)
 
+    # close the transaction
+    txn.Commit()
+
+    if dst not in prev:
+        return []
+
     # print the path
-    path = []
-    while True:
-        path.append(dst)
-        dst = prev[dst]
-        if dst == -1:
-            break
+    return _trace_back(prev, dst)[::-1]
+
+
+def bfs_paths_from(
+    db, src: int, targets: Iterable[int], cache: Optional[AdjacencyCache] = None
+) -> Dict[int, List[int]]:
+    """
+    Finds the shortest paths from src to every node in `targets`
+    with a single breadth-first search in a single read transaction.
+
+    The search stops as soon as all targets have been reached.
+
+    Returns a dict that maps each target to its path (src, ..., target).
+    The path is an empty list if the target is not reachable from src.
+    """
+    targets = list(targets)
+    txn = db.CreateReadTxn()
+    adj = _attach_cache(txn, cache)
+
+    prev = {src: -1}
+    remaining = set(targets)
+    remaining.discard(src)
+
+    q = deque([src])
+    while len(q) and remaining:
+        node = q.popleft()
+
+        for nbr in adj.out_neighbors(node):
+            if nbr not in prev:
+                prev[nbr] = node
+                q.append(nbr)
+                remaining.discard(nbr)
 
-    # close the transaction
     txn.Commit()
 
-    return path[::-1]
+    return {
+        target: _trace_back(prev, target)[::-1] if target in prev else []
+        for target in targets
+    }
+
+
+def _bidirectional_bfs_path_search(
+    db, src: int, dst: int, cache: Optional[AdjacencyCache] = None
+):
+    """
+    Bidirectional BFS. Expands from src over out-edges (ListDstVids)
+    and from dst over in-edges (ListSrcVids), one whole level at a time,
+    always growing the side with the smaller frontier.
+    """
+    if src == dst:
+        return [src]
+
+    txn = db.CreateReadTxn()
+    adj = _attach_cache(txn, cache)
+
+    # node -> previous node on the path from src (forward)
+    # or next node on the path to dst (backward)
+    prev = {src: -1}
+    succ = {dst: -1}
+    # node -> distance from src / to dst
+    dist_fwd = {src: 0}
+    dist_bwd = {dst: 0}
+
+    frontier_fwd = [src]
+    frontier_bwd = [dst]
+
+    meet = None
+    while frontier_fwd and frontier_bwd and meet is None:
+        forward = len(frontier_fwd) <= len(frontier_bwd)
+        if forward:
+            frontier, parents, dist = frontier_fwd, prev, dist_fwd
+            other_dist = dist_bwd
+        else:
+            frontier, parents, dist = frontier_bwd, succ, dist_bwd
+            other_dist = dist_fwd
+
+        # expand the whole level, then pick the shortest among all meeting points
+        next_frontier = []
+        best_len = None
+        for node in frontier:
+            if forward:
+                nbr_list = adj.out_neighbors(node)
+            else:
+                nbr_list = adj.in_neighbors(node)
+
+            for nbr in nbr_list:
+                if nbr not in parents:
+                    parents[nbr] = node
+                    dist[nbr] = dist[node] + 1
+                    next_frontier.append(nbr)
+                if nbr in other_dist:
+                    path_len = dist[node] + 1 + other_dist[nbr]
+                    if best_len is None or path_len < best_len:
+                        best_len = path_len
+                        meet = (node, nbr)
+
+        if forward:
+            frontier_fwd = next_frontier
+        else:
+            frontier_bwd = next_frontier
+
+    txn.Commit()
+
+    if meet is None:
+        return []
+
+    # the meeting edge is node -> nbr if we expanded forward, else nbr -> node
+    if forward:
+        head, tail = meet
+    else:
+        tail, head = meet
+    return _trace_back(prev, head)[::-1] + _trace_back(succ, tail)
@@ -1,5 +1,5 @@
 from argparse import ArgumentParser
-from bfs import bfs_path_search
+from bfs import bfs_paths_from
 from liblgraph_python_api import Galaxy
 
 
@@ -34,9 +34,11 @@ def main():
     db = galaxy.OpenGraph(args.graph_name, False)
 
     # run processes on the graph
-    print(path_str(bfs_path_search(db, src=0, dst=3)))
-    print(path_str(bfs_path_search(db, src=0, dst=6)))
-    print(path_str(bfs_path_search(db, src=0, dst=9)))
+    # all three paths share the same source, so one BFS sweep finds all of them
+    targets = [3, 6, 9]
+    paths = bfs_paths_from(db, src=0, targets=targets)
+    for dst in targets:
+        print(path_str(paths[dst]))
 
     # close the database and galaxy
     db.Close()
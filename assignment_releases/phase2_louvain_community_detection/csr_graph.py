@@ -0,0 +1,402 @@
+import os
+import struct
+import numpy as np
+from graph import coalesce_edges, read_csv_edge_arrays
+from typing import List, Dict, Tuple, Iterable, Optional
+
+# Binary snapshot layout (all values little-endian):
+#
+#   header (64 bytes): magic, version, n_rows, n_edges, n_duplicates, M, padding
+#   followed by the arrays listed in `_SNAPSHOT_ARRAYS`, stored back to back.
+#
+# The version should be bumped whenever the layout changes.
+SNAPSHOT_MAGIC = b"WDGCSR\x00\x00"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sIqqqd")
+_SNAPSHOT_HEADER_SIZE = 64
+
+# (attribute name, dtype, length: n_rows + 1 / n_edges / n_rows)
+_SNAPSHOT_ARRAYS = [
+    ("out_indptr", "<i8", "indptr"),
+    ("out_indices", "<i8", "edges"),
+    ("out_weights", "<f8", "edges"),
+    ("in_indptr", "<i8", "indptr"),
+    ("in_indices", "<i8", "edges"),
+    ("in_weights", "<f8", "edges"),
+    ("in_degree", "<f8", "rows"),
+    ("out_degree", "<f8", "rows"),
+]
+
+
+class CSRWeightedDiGraph:
+    """A weighted directed graph stored in compressed sparse row (CSR) format.
+
+    This class exposes the same public API as `WeightedDiGraph`
+    (`get_in_neighbors`, `get_edge_weight`, `get_degree`, `M`, `N`, ...),
+    so it can be used as a drop-in replacement in `Community` and `Louvain`.
+
+    Instead of dict-of-sets and a tuple-keyed edge dict, the adjacency is kept in
+    a handful of flat NumPy arrays, one CSR triple for each direction:
+
+    - `out_indptr`, `out_indices`, `out_weights`: out-neighbors of each node.
+      The out-neighbors of node `u` are `out_indices[out_indptr[u]:out_indptr[u + 1]]`.
+    - `in_indptr`, `in_indices`, `in_weights`: in-neighbors of each node.
+
+    Neighbor lists are sorted by node id, so edge lookups are binary searches.
+
+    NOTE: Node ids are used directly as row indices, so they should be
+    non-negative and (roughly) contiguous. The graph is immutable once built.
+    """
+
+    def __init__(self, edge_list: List[Tuple[int, int, int]]):
+        """Creates a weighted directed graph instance from a list of edges.
+
+        Args:
+            edge_list (List[Tuple[int, int, int]]): A list of edges, where each edge
+            is represented by a tuple (src, dst, weight).
+        """
+        edges = np.asarray(edge_list, dtype=np.float64).reshape(-1, 3)
+        self._build(
+            edges[:, 0].astype(np.int64),
+            edges[:, 1].astype(np.int64),
+            edges[:, 2],
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        src: np.ndarray,
+        dst: np.ndarray,
+        weight: Optional[np.ndarray] = None,
+        n_nodes: Optional[int] = None,
+    ) -> "CSRWeightedDiGraph":
+        """Builds a graph directly from parallel arrays of edge endpoints.
+
+        Duplicate (src, dst) pairs are merged by summing their weights.
+
+        Args:
+            src (np.ndarray): Source node of each edge.
+            dst (np.ndarray): Destination node of each edge.
+            weight (np.ndarray, optional): Weight of each edge. Defaults to all 1.
+            n_nodes (int, optional): Number of rows of the adjacency.
+                Defaults to `max(src, dst) + 1`.
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if weight is None:
+            weight = np.ones(len(src), dtype=np.float64)
+        graph = cls.__new__(cls)
+        graph._build(src, dst, np.asarray(weight, dtype=np.float64), n_nodes)
+        return graph
+
+    @classmethod
+    def from_graph(cls, graph) -> "CSRWeightedDiGraph":
+        """Converts a `WeightedDiGraph` to CSR format.
+        A `CSRWeightedDiGraph` is returned as is."""
+        if isinstance(graph, cls):
+            return graph
+        edges = list(graph.edges.items())
+        return cls.from_arrays(
+            np.array([src for (src, _), _ in edges], dtype=np.int64),
+            np.array([dst for (_, dst), _ in edges], dtype=np.int64),
+            np.array([weight for _, weight in edges], dtype=np.float64),
+        )
+
+    def _build(
+        self,
+        src: np.ndarray,
+        dst: np.ndarray,
+        weight: np.ndarray,
+        n_nodes: Optional[int] = None,
+    ):
+        """Sorts, coalesces and compresses the edges into the two CSR triples."""
+        if n_nodes is None:
+            n_nodes = int(max(src.max(), dst.max())) + 1 if len(src) else 0
+        self.n_rows = n_nodes
+
+        # sort edges by (src, dst) and sum up the weights of duplicated edges
+        src, dst, weight, self.n_duplicates = coalesce_edges(src, dst, weight)
+
+        # edges are now sorted by src, then by dst
+        self.out_indptr = self._indptr(src, n_nodes)
+        self.out_indices = dst
+        self.out_weights = weight
+
+        # re-sort by dst, then by src, for the in-neighbor lists
+        order = np.lexsort((src, dst))
+        self.in_indptr = self._indptr(dst, n_nodes)
+        self.in_indices = src[order]
+        self.in_weights = weight[order]
+
+        # node_id -> weighted in-/out-degree of the node
+        self.in_degree = np.bincount(dst, weights=weight, minlength=n_nodes)
+        self.out_degree = np.bincount(src, weights=weight, minlength=n_nodes)
+
+        self._finalize()
+
+    def _finalize(self, M: Optional[float] = None):
+        """Computes `nodes`, `M` and `N` from the CSR arrays."""
+        has_edges = (np.diff(self.out_indptr) > 0) | (np.diff(self.in_indptr) > 0)
+        # ids of nodes with at least one edge, in ascending order
+        self.nodes = np.flatnonzero(has_edges)
+
+        if M is None:
+            M = float(self.out_weights.sum())
+        self.M = M  # total edge weight
+        self.N = len(self.nodes)  # total number of nodes
+
+    @staticmethod
+    def _indptr(rows: np.ndarray, n_nodes: int) -> np.ndarray:
+        """Returns the CSR row pointer for (sorted) row ids."""
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+        return indptr
+
+    def _has_node(self, node: int) -> bool:
+        return 0 <= node < self.n_rows
+
+    def get_neighbors(self, node: int, remove_duplicates: bool = True) -> Iterable[int]:
+        """Returns the neighbors (both in- and out-neighbors) of a node.
+
+        Args:
+            node (int): Node ID.
+            remove_duplicates (bool, optional): Removes duplicated neighbors if is True.
+                If the neighbor is both an in- and out-neighbor, it will count only once.
+                Defaults to True.
+
+        Returns:
+            Iterable[int]: An array of neighbors. If remove_duplicates is True,
+                the neighbors are unique and sorted.
+        """
+        in_nbrs = self.get_in_neighbors(node)
+        out_nbrs = self.get_out_neighbors(node)
+        if remove_duplicates:
+            return np.union1d(in_nbrs, out_nbrs)
+
+        return np.concatenate([in_nbrs, out_nbrs])
+
+    def get_in_neighbors(self, node: int) -> np.ndarray:
+        """Returns the in-neighbors of a node, as a sorted (read-only) array view.
+        I.e., the nodes that have an edge pointing to the node.
+        """
+        if not self._has_node(node):
+            return self.in_indices[:0]
+        return self.in_indices[self.in_indptr[node] : self.in_indptr[node + 1]]
+
+    def get_out_neighbors(self, node: int) -> np.ndarray:
+        """Returns the out-neighbors of a node, as a sorted (read-only) array view.
+        I.e., the nodes for which the node has an edge pointing to them.
+        """
+        if not self._has_node(node):
+            return self.out_indices[:0]
+        return self.out_indices[self.out_indptr[node] : self.out_indptr[node + 1]]
+
+    def _find_edge(self, src: int, dst: int) -> int:
+        """Returns the position of edge (src, dst) in `out_indices`, or -1."""
+        if not self._has_node(src):
+            return -1
+        lo, hi = self.out_indptr[src], self.out_indptr[src + 1]
+        pos = lo + np.searchsorted(self.out_indices[lo:hi], dst)
+        if pos < hi and self.out_indices[pos] == dst:
+            return pos
+        return -1
+
+    def has_edge(self, src: int, dst: int) -> bool:
+        """Returns True if the edge (src, dst) exists in the graph."""
+        return self._find_edge(src, dst) >= 0
+
+    def get_edge_weight(self, src: int, dst: int) -> float:
+        pos = self._find_edge(src, dst)
+        # check if the edge exists
+        if pos < 0:
+            if self.has_edge(dst, src):
+                raise KeyError(
+                    f"Edge {src} -> {dst} not found, did you mean {dst} -> {src}?"
+                )
+            else:
+                raise KeyError(f"Edge {src} -> {dst} not found.")
+        return self.out_weights[pos]
+
+    def get_in_degree(self, node: int) -> float:
+        """Returns the in-degree of a node."""
+        if not self._has_node(node):
+            return 0
+        return self.in_degree[node]
+
+    def get_out_degree(self, node: int) -> float:
+        """Returns the out-degree of a node."""
+        if not self._has_node(node):
+            return 0
+        return self.out_degree[node]
+
+    def get_degree(self, node: int) -> float:
+        """Return the degree of a node (in + out)."""
+        return self.get_in_degree(node) + self.get_out_degree(node)
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns all edges as (src, dst, weight) arrays, sorted by (src, dst)."""
+        src = np.repeat(
+            np.arange(self.n_rows, dtype=np.int64), np.diff(self.out_indptr)
+        )
+        return src, self.out_indices, self.out_weights
+
+    @property
+    def edges(self) -> Dict[Tuple[int, int], float]:
+        """(src, dst) -> edge weight, for compatibility with `WeightedDiGraph`.
+
+        NOTE: This materializes a Python dict of all edges on every access.
+        Prefer `edge_arrays()` on large graphs.
+        """
+        src, dst, weight = self.edge_arrays()
+        return dict(zip(zip(src.tolist(), dst.tolist()), weight.tolist()))
+
+    def copy(self) -> "CSRWeightedDiGraph":
+        """Returns a deep copy of the graph."""
+        graph = self.__class__.__new__(self.__class__)
+        graph.__dict__.update(
+            {
+                k: np.array(v) if isinstance(v, np.ndarray) else v
+                for k, v in self.__dict__.items()
+            }
+        )
+        return graph
+
+    def save(self, path: str):
+        """Writes the graph to a versioned binary snapshot at `path`.
+
+        The snapshot can be reopened with `load()`, optionally memory-mapped,
+        so repeated runs and parallel workers can share one page-cached copy.
+        """
+        n_edges = len(self.out_indices)
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            self.n_rows,
+            n_edges,
+            self.n_duplicates,
+            self.M,
+        )
+        with open(path, "wb") as fo:
+            fo.write(header.ljust(_SNAPSHOT_HEADER_SIZE, b"\x00"))
+            for name, dtype, _ in _SNAPSHOT_ARRAYS:
+                np.ascontiguousarray(getattr(self, name), dtype=dtype).tofile(fo)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CSRWeightedDiGraph":
+        """Loads a graph from a binary snapshot written by `save()`.
+
+        Args:
+            path (str): Path to the snapshot file.
+            mmap (bool, optional): If True, the arrays are opened as read-only
+                `numpy.memmap`s instead of being read into memory. Defaults to True.
+        """
+        with open(path, "rb") as fi:
+            header = fi.read(_SNAPSHOT_HEADER_SIZE)
+        if len(header) < _SNAPSHOT_HEADER_SIZE:
+            raise ValueError(f"{path} is not a graph snapshot: file too short.")
+        magic, version, n_rows, n_edges, n_duplicates, M = _SNAPSHOT_HEADER.unpack(
+            header[: _SNAPSHOT_HEADER.size]
+        )
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot: bad magic {magic}.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version {version} in {path}, "
+                f"expected {SNAPSHOT_VERSION}."
+            )
+
+        lengths = {"indptr": n_rows + 1, "edges": n_edges, "rows": n_rows}
+        expected_size = _SNAPSHOT_HEADER_SIZE + 8 * sum(
+            lengths[kind] for _, _, kind in _SNAPSHOT_ARRAYS
+        )
+        if os.path.getsize(path) != expected_size:
+            raise ValueError(f"{path} is truncated or corrupted.")
+
+        graph = cls.__new__(cls)
+        graph.n_rows = n_rows
+        graph.n_duplicates = n_duplicates
+        offset = _SNAPSHOT_HEADER_SIZE
+        for name, dtype, kind in _SNAPSHOT_ARRAYS:
+            length = lengths[kind]
+            if mmap and length > 0:
+                arr = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset, shape=(length,)
+                )
+            else:
+                arr = np.fromfile(path, dtype=dtype, count=length, offset=offset)
+            setattr(graph, name, arr)
+            offset += 8 * length
+
+        graph._finalize(M)
+        return graph
+
+    @classmethod
+    def from_csv_edges(
+        cls, csv_path: str, has_header: bool = True
+    ) -> "CSRWeightedDiGraph":
+        """
+        Builds a weighted directed graph from a CSV file containing edges.
+        The CSV file should contain two or three columns: src, dst, and (optional) weight.
+
+        Duplicated edges are merged by adding up their weights.
+        """
+        graph = cls.from_arrays(*read_csv_edge_arrays(csv_path, has_header))
+        if graph.n_duplicates > 0:
+            print(
+                f"[!] {graph.n_duplicates} duplicate edges in {csv_path}. "
+                "Their weights are added to the existing edges."
+            )
+        return graph
+
+
+if __name__ == "__main__":
+    from graph import WeightedDiGraph
+
+    g = CSRWeightedDiGraph.from_csv_edges("./p2_data/test_graph.csv")
+    ref = WeightedDiGraph.from_csv_edges("./p2_data/test_graph.csv")
+
+    for v in range(10):
+        assert g.get_in_degree(v) == ref.get_in_degree(v)
+        assert g.get_out_degree(v) == ref.get_out_degree(v)
+        assert set(g.get_in_neighbors(v)) == ref.get_in_neighbors(v)
+        assert set(g.get_out_neighbors(v)) == ref.get_out_neighbors(v)
+        assert set(g.get_neighbors(v)) == ref.get_neighbors(v)
+
+    assert g.get_edge_weight(1, 2) == 10
+    assert g.has_edge(3, 3)
+    assert not g.has_edge(2, 1)
+    assert g.edges == ref.edges
+    assert g.M == 235  # total edge weight
+    assert g.N == 10  # total number of nodes
+
+    g2 = g.copy()
+    assert g2.edges == g.edges
+    assert g2.out_indices is not g.out_indices
+
+    # duplicated edges are merged
+    g3 = CSRWeightedDiGraph([(0, 1, 1), (1, 0, 2), (0, 1, 3)])
+    assert g3.get_edge_weight(0, 1) == 4
+    assert g3.n_duplicates == 1
+    assert g3.M == 6
+
+    # binary snapshot round trip
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "test_graph.bin")
+        g.save(path)
+        for mmap in (True, False):
+            g4 = CSRWeightedDiGraph.load(path, mmap=mmap)
+            assert g4.edges == g.edges
+            assert g4.M == g.M and g4.N == g.N
+            assert set(g4.get_in_neighbors(2)) == set([0, 1, 3, 8, 9])
+        assert isinstance(g4.copy().out_indices, np.ndarray)
+        del g4
+
+        g5 = WeightedDiGraph.load(path)
+        assert g5.edges == ref.edges
+        assert g5.in_neighbors == ref.in_neighbors
+        ref.save(path)
+        assert CSRWeightedDiGraph.load(path).edges == ref.edges
+
+    print("CSR graph tests passed!")
@@ -2,6 +2,81 @@ from collections import defaultdict
 from typing import List, Dict, Set, Tuple, Iterable
 
 
+def read_csv_edge_arrays(
+    csv_path: str, has_header: bool = True
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Parses a CSV file of edges into (src, dst, weight) arrays in one shot.
+
+    The CSV file should contain two or three integer columns:
+    src, dst, and (optional) weight. Missing weights default to 1.
+    """
+    import numpy as np
+
+    with open(csv_path, "r", encoding="utf-8") as fi:
+        if has_header:
+            _ = fi.readline()  # skip csv header
+        text = fi.read().replace("\r", "").strip()
+
+    if not text:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    # number of commas on each line, from the positions of "," and "\n"
+    chars = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    n_commas = np.cumsum(chars == ord(","))
+    line_ends = np.append(np.flatnonzero(chars == ord("\n")), len(chars) - 1)
+    n_cols = np.diff(n_commas[line_ends], prepend=0) + 1
+    bad = np.flatnonzero((n_cols != n_cols[0]) | (n_cols < 2) | (n_cols > 3))
+    if len(bad) > 0:
+        line = text.split("\n")[bad[0]]
+        raise ValueError(f"Invalid edge entry: {line.split(',')}")
+    n_cols = int(n_cols[0])
+
+    # parse the whole file as a flat list of comma-separated integers
+    values = np.fromstring(text.replace("\n", ","), dtype=np.int64, sep=",")
+    if len(values) != len(line_ends) * n_cols:
+        raise ValueError(f"Invalid edge entries in {csv_path}: non-integer values.")
+
+    entries = values.reshape(-1, n_cols)
+    if n_cols == 2:
+        return entries[:, 0], entries[:, 1], np.ones(len(entries), dtype=np.int64)
+    return entries[:, 0], entries[:, 1], entries[:, 2]
+
+
+def coalesce_edges(
+    src: "np.ndarray", dst: "np.ndarray", weight: "np.ndarray"
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]:
+    """Sorts edges by (src, dst) and merges duplicates by summing their weights.
+
+    Returns:
+        Tuple: (src, dst, weight, n_duplicates), where the first three are
+            the arrays of unique edges and `n_duplicates` is the number of
+            edges that have been merged into an existing edge.
+    """
+    import numpy as np
+
+    order = np.lexsort((dst, src))
+    src, dst, weight = src[order], dst[order], weight[order]
+
+    is_first = np.ones(len(src), dtype=bool)
+    is_first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    starts = np.flatnonzero(is_first)
+    if len(starts) == len(src):
+        return src, dst, weight, 0
+
+    weight = np.add.reduceat(weight, starts)
+    return src[starts], dst[starts], weight, len(src) - len(starts)
+
+
+def _group_starts(keys: "np.ndarray") -> "np.ndarray":
+    """Returns the start offsets of runs of equal values in a sorted array."""
+    import numpy as np
+
+    is_first = np.ones(len(keys), dtype=bool)
+    is_first[1:] = keys[1:] != keys[:-1]
+    return np.flatnonzero(is_first)
+
+
 class WeightedDiGraph:
     """A weighted directed graph, used for Louvain community detection."""
 
@@ -38,6 +113,52 @@ class WeightedDiGraph:
         self.M = sum(self.edges.values())  # total edge weight
         self.N = len(self.nodes)  # total number of nodes
 
+    @classmethod
+    def from_arrays(
+        cls, src: "np.ndarray", dst: "np.ndarray", weight: "np.ndarray"
+    ) -> "WeightedDiGraph":
+        """Builds a graph from arrays of unique edges in bulk,
+        without calling `add_edge` once per edge.
+
+        NOTE: The edges should be coalesced (see `coalesce_edges`),
+        i.e., sorted by (src, dst) and free of duplicates.
+        """
+        import numpy as np
+
+        graph = cls([])
+        if len(src) == 0:
+            return graph
+        # edge weights, degrees and M are floats, as with `add_edge`
+        weight = np.asarray(weight, dtype=np.float64)
+
+        src_list, dst_list = src.tolist(), dst.tolist()
+        graph.edges.update(zip(zip(src_list, dst_list), weight.tolist()))
+        graph.nodes.update(src_list)
+        graph.nodes.update(dst_list)
+
+        # edges are sorted by src, so each run of equal src is one out-neighbor set
+        starts = _group_starts(src)
+        ends = np.append(starts[1:], len(src)).tolist()
+        for node, lo, hi in zip(src[starts].tolist(), starts.tolist(), ends):
+            graph.out_neighbors[node] = set(dst_list[lo:hi])
+        out_degree = np.add.reduceat(weight, starts)
+        graph.out_degree.update(zip(src[starts].tolist(), out_degree.tolist()))
+
+        # re-sort by dst to group the in-neighbors
+        order = np.argsort(dst, kind="stable")
+        src_in, dst_in = src[order], dst[order]
+        src_in_list = src_in.tolist()
+        starts = _group_starts(dst_in)
+        ends = np.append(starts[1:], len(dst_in)).tolist()
+        for node, lo, hi in zip(dst_in[starts].tolist(), starts.tolist(), ends):
+            graph.in_neighbors[node] = set(src_in_list[lo:hi])
+        in_degree = np.add.reduceat(weight[order], starts)
+        graph.in_degree.update(zip(dst_in[starts].tolist(), in_degree.tolist()))
+
+        graph.M = weight.sum().item()  # total edge weight
+        graph.N = len(graph.nodes)  # total number of nodes
+        return graph
+
     def add_node(self, node: int):
         """Adds a node to the graph."""
         self.nodes.add(node)
@@ -145,6 +266,29 @@ class WeightedDiGraph:
             [(src, dst, weight) for (src, dst), weight in self.edges.items()]
         )
 
+    def save(self, path: str):
+        """Writes the graph to a versioned binary snapshot at `path`.
+
+        The snapshot stores the graph in CSR format,
+        see `CSRWeightedDiGraph.save` for details.
+        """
+        # imported here since csr_graph depends on this module
+        from csr_graph import CSRWeightedDiGraph
+
+        CSRWeightedDiGraph.from_graph(self).save(path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "WeightedDiGraph":
+        """Loads a graph from a binary snapshot written by `save()`.
+
+        With `mmap=True` the snapshot is memory-mapped while building the graph,
+        use `CSRWeightedDiGraph.load` to keep working on the mapped arrays directly.
+        """
+        from csr_graph import CSRWeightedDiGraph
+
+        src, dst, weight = CSRWeightedDiGraph.load(path, mmap).edge_arrays()
+        return cls.from_arrays(src, dst, weight)
+
     @classmethod
     def from_csv_edges(
         cls, csv_path: str, has_header: bool = True
@@ -152,7 +296,30 @@ class WeightedDiGraph:
         """
         Builds a weighted directed graph from a CSV file containing edges.
         The CSV file should contain two or three columns: src, dst, and (optional) weight.
+
+        Duplicated edges are merged by adding up their weights.
+        Uses numpy to parse the file in bulk if it is installed.
         """
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return cls._from_csv_edges_slow(csv_path, has_header)
+
+        src, dst, weight, n_duplicates = coalesce_edges(
+            *read_csv_edge_arrays(csv_path, has_header)
+        )
+        if n_duplicates > 0:
+            print(
+                f"[!] {n_duplicates} duplicate edges in {csv_path}. "
+                "Their weights are added to the existing edges."
+            )
+        return cls.from_arrays(src, dst, weight)
+
+    @classmethod
+    def _from_csv_edges_slow(
+        cls, csv_path: str, has_header: bool = True
+    ) -> "WeightedDiGraph":
+        """Pure Python fallback of `from_csv_edges`, adding one edge at a time."""
         edge_list = []
         with open(csv_path, "r", encoding="utf-8") as fi:
             if has_header:
@@ -5,11 +5,39 @@ from collections import defaultdict, Counter
 from graph import WeightedDiGraph
 from community import Community
 
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 
 
 class Louvain:
-    def __init__(self, graph: WeightedDiGraph):
+    def __init__(
+        self,
+        graph: WeightedDiGraph,
+        engine: str = "python",
+        min_modularity_gain: float = 0.0,
+        max_passes: Optional[int] = None,
+    ):
+        """
+        Args:
+            graph (WeightedDiGraph): The graph, or a `CSRWeightedDiGraph`.
+            engine (str, optional): "python" runs phase 1 with `Community` objects
+                (the code in this file), "array" runs it with `LocalMovingEngine`
+                on a CSR copy of the metagraph.
+                "parallel" is "array" with `ColoredLocalMovingEngine`, which moves
+                the nodes of each color class at once (the partition may differ).
+                Both engines compute the gains with `delta_modularity`.
+                Defaults to "python".
+            min_modularity_gain (float, optional): Stop after a pass whose phase 1
+                gains less modularity than this. Defaults to 0.0, i.e., run until
+                no node moves.
+            max_passes (int, optional): Maximum number of passes.
+                Defaults to `None`, i.e., no limit.
+        """
+        if engine not in ("python", "array", "parallel"):
+            raise ValueError(f"Unknown phase 1 engine: {engine}.")
+        self.engine = engine
+        self.min_modularity_gain = min_modularity_gain
+        self.max_passes = max_passes
+
         # Number of nodes in the original graph
         # NOTE: These attributes should NOT be modified.
         self.original_graph = graph
@@ -65,9 +93,40 @@ class Louvain:
         """Returns the community to which the given node belongs."""
         return self.communities[self.metanode2commid[node]]
 
-    def delta_modularity(self, node: int, community: Community) -> float:
+    def node2comm_weights(self, node: int) -> Dict[int, Tuple[float, float]]:
+        """Scans the in- and out-edges of a node once and returns
+        `{community_id: (w_in, w_out)}` for every community adjacent to the node.
+
+        `w_in` is the sum of weights of edges from the community to the node,
+        `w_out` the sum of weights of edges from the node to the community,
+        i.e., the values of `node2comm_in_degree` / `node2comm_out_degree`.
+        Self-loops are skipped, as if the node had been removed from its community.
+        """
+        weights: Dict[int, List[float]] = defaultdict(lambda: [0, 0])
+        for nbr in self.G.get_in_neighbors(node):
+            if nbr != node:
+                community_id = self.metanode2commid[nbr]
+                weights[community_id][0] += self.G.get_edge_weight(nbr, node)
+        for nbr in self.G.get_out_neighbors(node):
+            if nbr != node:
+                community_id = self.metanode2commid[nbr]
+                weights[community_id][1] += self.G.get_edge_weight(node, nbr)
+        return {
+            community_id: (w_in, w_out)
+            for community_id, (w_in, w_out) in weights.items()
+        }
+
+    def delta_modularity(
+        self,
+        node: int,
+        community: Community,
+        weights: Optional[Tuple[float, float]] = None,
+    ) -> float:
         """Computes Delta_Q(i -> C),
         i.e., the change in modularity if we move node i to community C.
+
+        `weights` is the optional `(w_in, w_out)` entry of `node2comm_weights(node)`
+        for the community, so that the edges of the node are not scanned again.
         """
 
         # TODO: (Task 3) Compute Delta_Q(i -> C), i.e.,
@@ -78,6 +137,10 @@ class Louvain:
         # 1. The formula for Delta_Q(i -> C) is given in the handout.
         # 2. Make use of the functions you have implemented in the `Community` class.
         # 3. You can get the sum of edge weights of the metagraph by `self.G.M`.
+        # 4. If `weights` is given, k_{i,in} is `weights[0] + weights[1]`,
+        #    which saves a call to `community.node2comm_degree(node)`.
+        #    (The "array" and "parallel" engines rely on this,
+        #    see `_engine_delta_modularity`.)
 
         ##################
         # Your Code Here #
@@ -89,9 +152,34 @@ class Louvain:
 
         return delta_q
 
-    def phase1(self):
+    def _engine_delta_modularity(self) -> Callable[[int, float, float, float], float]:
+        """Wraps `delta_modularity` for the array engines, which keep k_{i,in} and
+        the degrees of the communities in arrays instead of `Community` objects.
+
+        The returned function maps `(node, k_{i,in}, \\Sigma_tot^in, \\Sigma_tot^out)`
+        to Delta_Q(i -> C). The degrees are set on a placeholder community
+        without nodes, and k_{i,in} is passed as `weights`.
+        """
+        community = Community(id=-1, graph=self.G)
+
+        def delta_q(node, k_i_in, sigma_in, sigma_out):
+            community.in_degree, community.out_degree = sigma_in, sigma_out
+            return self.delta_modularity(node, community, (k_i_in, 0.0))
+
+        return delta_q
+
+    def phase1(self) -> Tuple[int, float]:
+        """
+        Returns:
+            Tuple[int, float]: The number of moves of all iterations,
+                and the total modularity gain.
+        """
+        if self.engine in ("array", "parallel"):
+            return self._phase1_array()
+
         n_metanodes = self.G.N
         num_iter = 0
+        n_moves = 0
         modularity_gain = 0
         while True:
             num_iter += 1
@@ -115,6 +203,12 @@ class Louvain:
                 # Hints:
                 # 1. Delta_Q(C -> i) = -Delta_Q(i -> C)
                 # 2. Only one line of code is required here.
+                # 3. (Optional) To avoid re-scanning the edges of the node for every
+                #    candidate community, compute the weights of all adjacent
+                #    communities once here, with
+                #    `nbr_comm_weights = self.node2comm_weights(metanode)`,
+                #    and pass `nbr_comm_weights.get(old_community.id, (0, 0))`
+                #    as `weights` to `delta_modularity`.
 
                 delta_q_del = ...
 
@@ -137,6 +231,8 @@ class Louvain:
                     # Update best_modularity and best_community
                     # if the new community has a higher modularity gain.
                     # Around 5 lines of code expected.
+                    # (Optional) Pass `nbr_comm_weights[new_community.id]` as `weights`,
+                    # if you have computed `nbr_comm_weights` above.
 
                     ##################
                     # Your Code Here #
@@ -154,6 +250,8 @@ class Louvain:
                     changed = True
                     n_changed += 1
 
+            n_moves += n_changed
+
             print(
                 f"| Pass: {self.n_passes:3d} "
                 f"| Phase 1 | Iter: {num_iter:3d} "
@@ -165,6 +263,63 @@ class Louvain:
             if not changed:
                 break
 
+        return n_moves, modularity_gain
+
+    def _phase1_array(self) -> Tuple[int, float]:
+        """Phase 1 with `LocalMovingEngine`, visiting nodes in the same order,
+        or with `ColoredLocalMovingEngine`."""
+        # imported here, so that the "python" engine does not require numpy
+        import numpy as np
+        from csr_graph import CSRWeightedDiGraph
+        from louvain_engine import ColoredLocalMovingEngine, LocalMovingEngine
+
+        n_metanodes = self.G.N
+        graph = CSRWeightedDiGraph.from_graph(self.G)
+        communities = list(range(graph.n_rows))
+        for metanode, community_id in self.metanode2commid.items():
+            communities[metanode] = community_id
+        delta_q = self._engine_delta_modularity()
+        if self.engine == "parallel":
+            engine = ColoredLocalMovingEngine(graph, delta_q, communities)
+        else:
+            engine = LocalMovingEngine(graph, delta_q, communities)
+
+        num_iter = 0
+        n_moves = 0
+        modularity_gain = 0
+        while True:
+            num_iter += 1
+            if self.engine == "parallel":
+                n_changed, gain = engine.sweep()
+            else:
+                n_changed, gain = engine.move_nodes(range(n_metanodes))
+            n_moves += n_changed
+            modularity_gain += gain
+            changed = n_changed > 0
+
+            print(
+                f"| Pass: {self.n_passes:3d} "
+                f"| Phase 1 | Iter: {num_iter:3d} "
+                f"| Nodes changed: {n_changed:5d} ({changed}) "
+                f"| #Communities: {len(set(engine.comm[:n_metanodes])):5d} "
+                f"| Modularity gain: {modularity_gain:.4f} |"
+            )
+
+            if not changed:
+                break
+
+        # write the partition back to `metanode2commid` and `communities`
+        members = defaultdict(set)
+        partition = np.asarray(engine.comm[:n_metanodes]).tolist()
+        for metanode, community_id in enumerate(partition):
+            self.metanode2commid[metanode] = community_id
+            members[community_id].add(metanode)
+        self.communities = {
+            community_id: Community(id=community_id, graph=self.G, nodes=nodes)
+            for community_id, nodes in members.items()
+        }
+        return n_moves, modularity_gain
+
     def _update_node2commid(self):
         """Reassign nodes to their new communities after phase 1."""
 
@@ -238,19 +393,25 @@ class Louvain:
 
         edge_list = [(src, dst, weight) for (src, dst), weight in new_edges.items()]
 
-        return WeightedDiGraph(edge_list)
+        # build the new metagraph with the same storage backend as the current one
+        return type(self.G)(edge_list)
 
     def louvain(self):
         random.seed(0)
         self.n_passes = 0
-        while True:
+        while self.max_passes is None or self.n_passes < self.max_passes:
             self.n_passes += 1
 
-            self.phase1()
-            g = self.phase2()
+            n_moves, modularity_gain = self.phase1()
+            # no metanode moved: the partition of the original graph
+            # is unchanged, and so would be the new metagraph
+            if n_moves == 0:
+                break
 
-            # check if the new metagraph is the same as the old one
-            if g.edges == self.G.edges:
+            g = self.phase2()
+            # every community is still a single metanode (the moves cancelled out),
+            # so the new metagraph is the old one with relabeled nodes
+            if len(self.communities) == self.G.N:
                 break
 
             # update the metagraph
@@ -258,6 +419,9 @@ class Louvain:
             self.communities = self._init_communities(self.G, self.G.N)
             self.metanode2commid = {node_id: node_id for node_id in range(self.G.N)}
 
+            if modularity_gain < self.min_modularity_gain:
+                break
+
         return self.node2commid
 
     def merge_communities(
@@ -0,0 +1,377 @@
+import numpy as np
+from csr_graph import CSRWeightedDiGraph
+from graph import _group_starts
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+class LocalMovingEngine:
+    """Phase 1 of Louvain (local moving) on flat arrays.
+
+    The state of the partition is kept in three arrays indexed by id:
+
+    - `comm[i]`: the community of node i.
+    - `sigma_in[c]`, `sigma_out[c]`: the total in-/out-degree of community c
+      (\\Sigma_tot^in and \\Sigma_tot^out in the formula).
+
+    To move node i, a single scan over its out- and in-edges (two CSR rows)
+    adds the weight of every edge to `acc[comm[j]]`, a scratch accumulator that
+    is reused for all nodes. This yields k_{i,in} for every candidate community
+    at once, so a sweep over all nodes costs O(|E|). The modularity gain of each
+    candidate is then computed by `delta_modularity`.
+
+    The arrays are Python lists, which are faster than NumPy arrays
+    for the scalar reads and writes of the inner loop.
+
+    Args:
+        graph (CSRWeightedDiGraph): The (meta)graph.
+        delta_modularity (Callable): `(i, k_{i,in}, \\Sigma_tot^in, \\Sigma_tot^out)`
+            -> Delta_Q(i -> C), for node i (removed from its community)
+            and a community C with these degrees,
+            see `Louvain._engine_delta_modularity`.
+        communities (List[int], optional): Initial community of each node.
+            Defaults to `None`, i.e., each node is its own community.
+    """
+
+    def __init__(
+        self,
+        graph: CSRWeightedDiGraph,
+        delta_modularity: Callable[[int, float, float, float], float],
+        communities: Optional[List[int]] = None,
+    ):
+        n = graph.n_rows
+        self.m = graph.M
+        self.delta_modularity = delta_modularity
+
+        self.out_indptr = graph.out_indptr.tolist()
+        self.out_indices = graph.out_indices.tolist()
+        self.out_weights = graph.out_weights.tolist()
+        self.in_indptr = graph.in_indptr.tolist()
+        self.in_indices = graph.in_indices.tolist()
+        self.in_weights = graph.in_weights.tolist()
+        self.k_in = graph.in_degree.tolist()
+        self.k_out = graph.out_degree.tolist()
+
+        self.comm = list(communities) if communities is not None else list(range(n))
+        self.sigma_in = [0.0] * n
+        self.sigma_out = [0.0] * n
+        for node, c in enumerate(self.comm):
+            self.sigma_in[c] += self.k_in[node]
+            self.sigma_out[c] += self.k_out[node]
+
+        # community -> weight of the edges between the current node and it
+        self._acc = [0.0] * n
+        # community -> last node whose scan touched it, marks valid `_acc` entries
+        self._stamp = [-1] * n
+        # community -> smallest adjacent node id met in the current scan
+        self._first = [0] * n
+
+    def _scan(self, node: int) -> List[int]:
+        """Accumulates the edge weights between `node` and each adjacent community
+        into `_acc`. Returns the adjacent communities, ordered by their smallest
+        node id adjacent to `node`."""
+        comm, acc, stamp, first = self.comm, self._acc, self._stamp, self._first
+        touched = []
+        for indptr, indices, weights in (
+            (self.out_indptr, self.out_indices, self.out_weights),
+            (self.in_indptr, self.in_indices, self.in_weights),
+        ):
+            for e in range(indptr[node], indptr[node + 1]):
+                nbr = indices[e]
+                if nbr == node:
+                    # self-loops do not connect the node to any community
+                    continue
+                c = comm[nbr]
+                if stamp[c] != node:
+                    stamp[c] = node
+                    acc[c] = 0.0
+                    first[c] = nbr
+                    touched.append(c)
+                elif nbr < first[c]:
+                    first[c] = nbr
+                acc[c] += weights[e]
+
+        # same order as visiting the sorted neighbors in `Louvain.phase1`,
+        # so that ties are broken the same way
+        touched.sort(key=first.__getitem__)
+        return touched
+
+    def move_nodes(self, nodes: Iterable[int]) -> Tuple[int, float]:
+        """Visits `nodes` once, in order, moving each node to the adjacent community
+        with the largest modularity gain (if the gain is positive).
+
+        Returns:
+            Tuple[int, float]: The number of nodes that changed their community,
+                and the total modularity gain of the sweep.
+        """
+        if self.m == 0:
+            return 0, 0.0
+        delta_modularity = self.delta_modularity
+        comm, acc, stamp = self.comm, self._acc, self._stamp
+        sigma_in, sigma_out = self.sigma_in, self.sigma_out
+        k_in, k_out = self.k_in, self.k_out
+
+        n_changed = 0
+        modularity_gain = 0.0
+        for node in nodes:
+            ki_in, ki_out = k_in[node], k_out[node]
+
+            # remove the node from its old community
+            old = comm[node]
+            sigma_in[old] -= ki_in
+            sigma_out[old] -= ki_out
+
+            touched = self._scan(node)
+
+            # Delta_Q(D -> i) = -Delta_Q(i -> D)
+            k_old = acc[old] if stamp[old] == node else 0.0
+            delta_q_del = -delta_modularity(node, k_old, sigma_in[old], sigma_out[old])
+
+            best_modularity = 0.0
+            best = old
+            for c in touched:
+                if c == old:
+                    continue
+                delta_q = delta_q_del + delta_modularity(
+                    node, acc[c], sigma_in[c], sigma_out[c]
+                )
+                if delta_q > best_modularity:
+                    best_modularity = delta_q
+                    best = c
+
+            # add the node to the best community
+            comm[node] = best
+            sigma_in[best] += ki_in
+            sigma_out[best] += ki_out
+            modularity_gain += best_modularity
+            if best != old:
+                n_changed += 1
+
+        return n_changed, modularity_gain
+
+
+def color_graph(graph: CSRWeightedDiGraph, seed: int = 0) -> np.ndarray:
+    """Colors the nodes so that adjacent nodes (in either direction)
+    have different colors, with the Jones-Plassmann scheme.
+
+    Every node gets a random priority. In each round, the uncolored nodes with
+    a higher priority than all their uncolored neighbors form an independent set,
+    which takes the next color. A round is a few array operations over the edges
+    between uncolored nodes, and colored nodes drop out of the edge arrays.
+
+    Args:
+        graph (CSRWeightedDiGraph): The (meta)graph.
+        seed (int, optional): Seed of the priorities. Defaults to 0.
+
+    Returns:
+        np.ndarray: The color of each node (row), in `[0, n_colors)`.
+    """
+    n = graph.n_rows
+    src, dst, _ = graph.edge_arrays()
+    # both directions, without self-loops, sorted by src
+    no_loop = src != dst
+    src, dst = src[no_loop], dst[no_loop]
+    src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+    order = np.argsort(src, kind="stable")
+    src, dst = src[order], dst[order]
+
+    priority = np.random.default_rng(seed).permutation(n)
+    colors = np.full(n, -1, dtype=np.int64)
+    uncolored = np.arange(n)
+    n_colors = 0
+    while len(uncolored) > 0:
+        # highest priority among the uncolored neighbors of each node
+        nbr_max = np.full(n, -1, dtype=np.int64)
+        if len(src) > 0:
+            starts = _group_starts(src)
+            nbr_max[src[starts]] = np.maximum.reduceat(priority[dst], starts)
+
+        winners = priority[uncolored] > nbr_max[uncolored]
+        colors[uncolored[winners]] = n_colors
+        uncolored = uncolored[~winners]
+        n_colors += 1
+
+        keep = (colors[src] < 0) & (colors[dst] < 0)
+        src, dst = src[keep], dst[keep]
+    return colors
+
+
+def _prefix_charge(keys: np.ndarray, k_in: np.ndarray, k_out: np.ndarray) -> np.ndarray:
+    """For each item i, sums k_i^in * k_j^out + k_i^out * k_j^in over the items j
+    before i with the same key."""
+    order = np.argsort(keys, kind="stable")
+    k_in, k_out = k_in[order], k_out[order]
+    # exclusive prefix sums, restarted at every key
+    prev_in = np.cumsum(k_in) - k_in
+    prev_out = np.cumsum(k_out) - k_out
+    starts = _group_starts(keys[order])
+    lengths = np.diff(np.append(starts, len(keys)))
+    prev_in -= np.repeat(prev_in[starts], lengths)
+    prev_out -= np.repeat(prev_out[starts], lengths)
+
+    charge = np.empty(len(keys))
+    charge[order] = k_in * prev_out + k_out * prev_in
+    return charge
+
+
+class ColoredLocalMovingEngine:
+    """Phase 1 of Louvain (local moving), one color class at a time with NumPy.
+
+    The nodes are colored with `color_graph`, so nodes of the same color are not
+    adjacent: while they move, the edge weights between each of them and every
+    community stay the same. The moves of a whole color class are therefore
+    evaluated at once: the weights of all its edges are summed per
+    (node, community) pair with one sort of `node * n + community` keys
+    and a `reduceat`, instead of a loop per node. `delta_modularity` is then
+    called once per pair, as in `LocalMovingEngine`.
+
+    Nodes of the same color still interact through the community degrees:
+    two nodes joining (or two nodes leaving) the same community gain less than
+    the sum of their gains alone, by (k_i^in k_j^out + k_i^out k_j^in) / m^2.
+    Such conflicts are resolved deterministically. The candidate moves are ranked
+    by gain (ties by node id), and each one is charged this term for every
+    higher-ranked candidate with the same old or new community. Only moves with a
+    positive gain after the charge are applied, so each color class increases the
+    modularity. The other nodes are retried in the next sweep.
+
+    Args:
+        graph (CSRWeightedDiGraph): The (meta)graph.
+        delta_modularity (Callable): Delta_Q(i -> C), see `LocalMovingEngine`.
+        communities (List[int], optional): Initial community of each node.
+            Defaults to `None`, i.e., each node is its own community.
+        seed (int, optional): Seed of the coloring. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        graph: CSRWeightedDiGraph,
+        delta_modularity: Callable[[int, float, float, float], float],
+        communities: Optional[List[int]] = None,
+        seed: int = 0,
+    ):
+        n = graph.n_rows
+        self.m = graph.M
+        self.delta_modularity = delta_modularity
+        self.k_in = graph.in_degree
+        self.k_out = graph.out_degree
+
+        if communities is None:
+            communities = np.arange(n)
+        self.comm = np.array(communities, dtype=np.int64)
+        self.sigma_in = np.bincount(self.comm, weights=self.k_in, minlength=n)
+        self.sigma_out = np.bincount(self.comm, weights=self.k_out, minlength=n)
+
+        self.colors = color_graph(graph, seed)
+        self.n_colors = int(self.colors.max()) + 1 if n > 0 else 0
+
+        # the edges of each node in both directions, without self-loops,
+        # grouped by the color of the node: the edges of color k are
+        # `_src[_color_ptr[k]:_color_ptr[k + 1]]` (same for `_nbr`, `_weight`)
+        src, dst, weight = graph.edge_arrays()
+        no_loop = src != dst
+        src, dst, weight = src[no_loop], dst[no_loop], weight[no_loop]
+        src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+        weight = np.concatenate([weight, weight])
+        order = np.argsort(self.colors[src], kind="stable")
+        self._src, self._nbr, self._weight = src[order], dst[order], weight[order]
+        self._color_ptr = np.searchsorted(
+            self.colors[self._src], np.arange(self.n_colors + 1)
+        )
+
+    def sweep(self) -> Tuple[int, float]:
+        """Visits every node once, one color class after another.
+
+        Returns:
+            Tuple[int, float]: The number of nodes that changed their community,
+                and the total modularity gain of the sweep.
+        """
+        if self.m == 0:
+            return 0, 0.0
+        n_changed = 0
+        modularity_gain = 0.0
+        for color in range(self.n_colors):
+            n, gain = self._move_color(color)
+            n_changed += n
+            modularity_gain += gain
+        return n_changed, modularity_gain
+
+    def _delta_q(
+        self,
+        nodes: np.ndarray,
+        k_i_c: np.ndarray,
+        sigma_in: np.ndarray,
+        sigma_out: np.ndarray,
+    ) -> np.ndarray:
+        """Calls `delta_modularity` on each element of the arrays."""
+        args = zip(
+            nodes.tolist(), k_i_c.tolist(), sigma_in.tolist(), sigma_out.tolist()
+        )
+        return np.array([self.delta_modularity(*a) for a in args], dtype=np.float64)
+
+    def _move_color(self, color: int) -> Tuple[int, float]:
+        """Moves the nodes of one color class, see the class docstring."""
+        lo, hi = self._color_ptr[color], self._color_ptr[color + 1]
+        if lo == hi:
+            return 0, 0.0
+        m, comm = self.m, self.comm
+        sigma_in, sigma_out = self.sigma_in, self.sigma_out
+
+        # (node, community) pairs, sorted by node, with their edge weight k_{i,C}
+        keys = self._src[lo:hi] * len(comm) + comm[self._nbr[lo:hi]]
+        order = np.argsort(keys)
+        keys = keys[order]
+        pair_starts = _group_starts(keys)
+        acc = np.add.reduceat(self._weight[lo:hi][order], pair_starts)
+        node, cand = np.divmod(keys[pair_starts], len(comm))
+
+        starts = _group_starts(node)
+        # index of the node of each pair in `nodes`
+        group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(node))))
+
+        nodes = node[starts]
+        old = comm[nodes]
+        ki_in, ki_out = self.k_in[nodes], self.k_out[nodes]
+        is_old = cand == old[group]
+        k_old = np.bincount(group[is_old], weights=acc[is_old], minlength=len(nodes))
+
+        # Delta_Q(D -> i), with the node removed from its old community D
+        delta_q_del = -self._delta_q(
+            nodes, k_old, sigma_in[old] - ki_in, sigma_out[old] - ki_out
+        )
+        delta_q = delta_q_del[group] + self._delta_q(
+            nodes[group], acc, sigma_in[cand], sigma_out[cand]
+        )
+        delta_q[is_old] = -np.inf
+
+        # best community of each node, ties broken by the smallest community id
+        best = np.lexsort((cand, -delta_q, group))[starts]
+        gain = delta_q[best]
+        movers = np.flatnonzero(gain > 0)
+        if len(movers) == 0:
+            return 0, 0.0
+
+        # rank the candidate moves and charge them for their conflicts
+        rank = np.lexsort((nodes[movers], -gain[movers]))
+        movers = movers[rank]
+        best = best[movers]
+        new = cand[best]
+        charge = _prefix_charge(old[movers], ki_in[movers], ki_out[movers])
+        charge += _prefix_charge(new, ki_in[movers], ki_out[movers])
+        accept = gain[movers] - charge / m**2 > 0
+        movers, best, new = movers[accept], best[accept], new[accept]
+
+        moved, old = nodes[movers], old[movers]
+        ki_in, ki_out = ki_in[movers], ki_out[movers]
+        touched = np.union1d(old, new)
+        penalty = (sigma_in[touched] * sigma_out[touched]).sum()
+
+        comm[moved] = new
+        np.subtract.at(sigma_in, old, ki_in)
+        np.subtract.at(sigma_out, old, ki_out)
+        np.add.at(sigma_in, new, ki_in)
+        np.add.at(sigma_out, new, ki_out)
+
+        # the exact gain: movers are not adjacent, so the weight inside
+        # communities changes by k_{i,new} - k_{i,old} for each of them
+        penalty = (sigma_in[touched] * sigma_out[touched]).sum() - penalty
+        modularity_gain = (acc[best] - k_old[movers]).sum() / m - penalty / m**2
+        return len(moved), modularity_gain
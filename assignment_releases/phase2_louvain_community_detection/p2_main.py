@@ -27,6 +27,13 @@ def parse_args():
         type=str,
         default="/root/ai3602/p2_CommunityDetection/p2_data/p2_prediction.csv",
     )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default=None,
+        help="binary snapshot of the graph, read instead of the db if it exists, "
+        "otherwise written after reading the db",
+    )
 
     return parser.parse_args()
 
@@ -45,7 +52,7 @@ def main(args):
     galaxy.SetCurrentUser(args.username, args.password)
     db = galaxy.OpenGraph(args.graph_name)
 
-    res = Process(db, gt_map)
+    res = Process(db, gt_map, snapshot_path=args.snapshot)
 
     db.Close()
     galaxy.Close()
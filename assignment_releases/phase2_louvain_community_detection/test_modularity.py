@@ -2,6 +2,12 @@ import unittest
 from community import Community
 from graph import WeightedDiGraph
 from louvain import Louvain
+from csr_graph import CSRWeightedDiGraph
+from louvain_engine import (
+    ColoredLocalMovingEngine,
+    LocalMovingEngine,
+    color_graph,
+)
 
 
 def _get_graph():
@@ -148,5 +154,123 @@ class TestDeltaModularity(unittest.TestCase):
         # self.assertAlmostEqual(dq, -0.04119511090991399)
 
 
+class TestNode2CommWeights(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.graph = _get_graph()
+
+    def test_singletons(self):
+        louvain = Louvain(self.graph)
+        self.assertEqual(
+            louvain.node2comm_weights(2),
+            {1: (10, 0), 3: (15, 5), 8: (20, 0), 9: (15, 0), 0: (5, 0), 4: (0, 10)},
+        )
+        # the self-loop 3 -> 3 is skipped
+        self.assertEqual(
+            louvain.node2comm_weights(3), {2: (5, 15), 0: (15, 0), 4: (0, 5)}
+        )
+
+    def test_merged(self):
+        # community 0 = {0, 2, 3}, see TestNode2CommDegree.test_node2comm
+        louvain = Louvain(self.graph)
+        louvain.metanode2commid.update({2: 0, 3: 0})
+        for node, expected in [(1, 10), (4, 15), (9, 25)]:
+            self.assertEqual(sum(louvain.node2comm_weights(node)[0]), expected)
+
+
+class TestLocalMovingEngine(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.graph = CSRWeightedDiGraph.from_csv_edges("./p2_data/test_graph.csv")
+        # the engines compute Delta_Q with `Louvain.delta_modularity`
+        self.delta_q = Louvain(self.graph)._engine_delta_modularity()
+
+    def _modularity(self, comm):
+        # Q = sum_C (w_C / m - Sigma_C^in * Sigma_C^out / m^2)
+        m = self.graph.M
+        q = 0.0
+        for (src, dst), weight in self.graph.edges.items():
+            if comm[src] == comm[dst]:
+                q += weight / m
+        for c in set(comm):
+            nodes = [node for node in range(len(comm)) if comm[node] == c]
+            sigma_in = sum(self.graph.get_in_degree(node) for node in nodes)
+            sigma_out = sum(self.graph.get_out_degree(node) for node in nodes)
+            q -= sigma_in * sigma_out / m**2
+        return q
+
+    def test_sigma(self):
+        # community 1 = {1, 2}, see TestCommunity.test_remove_node
+        engine = LocalMovingEngine(
+            self.graph, self.delta_q, [0, 1, 1, 3, 4, 5, 6, 7, 8, 9]
+        )
+        self.assertEqual(engine.sigma_in[1], 5 + 65)
+        self.assertEqual(engine.sigma_out[1], 70 + 15)
+        self.assertEqual(engine.sigma_in[2], 0)
+
+    def test_scan(self):
+        # community 0 = {0, 2, 3}, see TestNode2CommDegree.test_node2comm
+        engine = LocalMovingEngine(
+            self.graph, self.delta_q, [0, 1, 0, 0, 4, 5, 6, 7, 8, 9]
+        )
+        for node, expected in [(1, 10), (4, 15), (9, 25)]:
+            self.assertIn(0, engine._scan(node))
+            self.assertEqual(engine._acc[0], expected)
+        # 2 -> 3, 3 -> 2 and 0 -> 3, the self-loop 3 -> 3 is skipped
+        engine._scan(3)
+        self.assertEqual(engine._acc[0], 5 + 15 + 15)
+
+    def test_move_nodes(self):
+        engine = LocalMovingEngine(self.graph, self.delta_q)
+        q_before = self._modularity(engine.comm)
+        n_changed, gain = engine.move_nodes(range(self.graph.N))
+        self.assertGreater(n_changed, 0)
+        self.assertAlmostEqual(gain, self._modularity(engine.comm) - q_before)
+
+    def test_color_graph(self):
+        colors = color_graph(self.graph)
+        for src, dst in self.graph.edges:
+            if src != dst:
+                self.assertNotEqual(colors[src], colors[dst])
+
+    def test_colored_sweep(self):
+        engine = ColoredLocalMovingEngine(self.graph, self.delta_q)
+        q_before = self._modularity(engine.comm)
+        n_changed, gain = engine.sweep()
+        self.assertGreater(n_changed, 0)
+        self.assertGreater(gain, 0)
+        self.assertAlmostEqual(gain, self._modularity(engine.comm) - q_before)
+        for c in range(self.graph.n_rows):
+            nodes = engine.comm == c
+            self.assertAlmostEqual(engine.sigma_in[c], engine.k_in[nodes].sum())
+            self.assertAlmostEqual(engine.sigma_out[c], engine.k_out[nodes].sum())
+
+
+class TestConvergence(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.graph = CSRWeightedDiGraph.from_csv_edges("./p2_data/test_graph.csv")
+
+    def test_converged(self):
+        louvain = Louvain(self.graph, engine="array")
+        node2commid = louvain.louvain()
+        # the last pass moves no node and stops before phase 2
+        self.assertEqual(louvain.n_passes, 3)
+        self.assertEqual(len(set(node2commid.values())), 2)
+
+    def test_max_passes(self):
+        louvain = Louvain(self.graph, engine="array", max_passes=1)
+        node2commid = louvain.louvain()
+        self.assertEqual(louvain.n_passes, 1)
+        self.assertEqual(len(set(node2commid.values())), 4)
+
+    def test_min_modularity_gain(self):
+        louvain = Louvain(self.graph, engine="array", min_modularity_gain=0.1)
+        node2commid = louvain.louvain()
+        # the first pass gains 0.33, the second one 0.04
+        self.assertEqual(louvain.n_passes, 2)
+        self.assertEqual(len(set(node2commid.values())), 2)
+
+
 if __name__ == "__main__":
     unittest.main()
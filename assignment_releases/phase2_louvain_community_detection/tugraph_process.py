@@ -1,6 +1,7 @@
+import os
 from louvain import Louvain
 from graph import WeightedDiGraph
-from typing import Dict
+from typing import Dict, Optional
 
 
 def read_from_tugraph_db(db) -> WeightedDiGraph:
@@ -36,10 +37,35 @@ def read_from_tugraph_db(db) -> WeightedDiGraph:
     return WeightedDiGraph(edge_list)
 
 
-def Process(db, gt_map: Dict[int, int]):
+def load_graph(db, snapshot_path: Optional[str] = None) -> WeightedDiGraph:
+    """Loads the graph from a binary snapshot, falling back to the db.
+
+    If `snapshot_path` is given but the file does not exist yet,
+    the graph is read from the db and saved to `snapshot_path` for later runs.
+
+    Args:
+        db: A TuGraph db handler.
+        snapshot_path (str, optional): Path to a snapshot written by
+            `WeightedDiGraph.save`. Defaults to `None`, i.e., always read the db.
+    """
+    if snapshot_path is not None and os.path.exists(snapshot_path):
+        return WeightedDiGraph.load(snapshot_path)
+
     graph = read_from_tugraph_db(db)
+    if snapshot_path is not None:
+        graph.save(snapshot_path)
+    return graph
+
+
+def Process(
+    db,
+    gt_map: Dict[int, int],
+    snapshot_path: Optional[str] = None,
+    engine: str = "python",
+):
+    graph = load_graph(db, snapshot_path)
 
-    lv = Louvain(graph)
+    lv = Louvain(graph, engine=engine)
     res = lv.louvain()
     res = lv.merge_communities(res, n_expected_communities=5, gt_map=gt_map)
 
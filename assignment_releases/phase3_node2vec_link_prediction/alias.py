@@ -0,0 +1,92 @@
+import torch
+import random
+from typing import List, Sequence, Tuple, Union
+
+
+def build_alias_table(probs: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Builds an alias table from a discrete distribution with Vose's method.
+
+    Args:
+        probs (Sequence[float]): Probabilities (or unnormalized weights).
+
+    Returns:
+        Tuple[List[float], List[int]]: `(accept, alias)`. To sample, pick a
+            column `i` uniformly, keep `i` with probability `accept[i]`,
+            and return `alias[i]` otherwise.
+    """
+    n = len(probs)
+    tot = sum(probs)
+    scaled = [p * n / tot for p in probs]
+
+    accept = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+    while small and large:
+        s = small.pop()
+        g = large.pop()
+        accept[s] = scaled[s]
+        alias[s] = g
+        # the large column donates (1 - scaled[s]) of its mass to column s
+        scaled[g] = scaled[g] + scaled[s] - 1.0
+        if scaled[g] < 1.0:
+            small.append(g)
+        else:
+            large.append(g)
+
+    # the remaining columns are full up to numerical error
+    for i in small + large:
+        accept[i] = 1.0
+    return accept, alias
+
+
+class AliasTable:
+    """Draws items from a fixed discrete distribution in O(1) per sample.
+
+    Args:
+        items (Sequence[int]): The items to sample from, e.g., neighbor node ids.
+        probs (Sequence[float]): Probabilities (or unnormalized weights) of the items.
+    """
+
+    __slots__ = ("items", "accept", "alias")
+
+    def __init__(self, items: Sequence[int], probs: Sequence[float]):
+        self.items = items
+        self.accept, self.alias = build_alias_table(probs)
+
+    def draw(self) -> int:
+        """Returns one item. A single uniform number picks both column and coin."""
+        u = random.random() * len(self.items)
+        col = int(u)
+        if u - col < self.accept[col]:
+            return self.items[col]
+        return self.items[self.alias[col]]
+
+
+class AliasSampler:
+    """Draws whole tensors of node ids from a fixed discrete distribution.
+
+    The vectorized counterpart of `AliasTable`, for negative sampling:
+    a batch of samples costs one `randint`, one `rand` and two gathers,
+    independent of the number of nodes.
+
+    Args:
+        weights (torch.Tensor): Unnormalized weight of each node id,
+            e.g., node frequencies raised to the power of 0.75.
+            Nodes with zero weight are never drawn.
+    """
+
+    def __init__(self, weights: torch.Tensor):
+        accept, alias = build_alias_table(weights.double().tolist())
+        self.accept = torch.tensor(accept, dtype=torch.float32)
+        self.alias = torch.tensor(alias, dtype=torch.long)
+
+    def __len__(self) -> int:
+        return len(self.accept)
+
+    def sample(self, size: Union[int, Tuple[int, ...]]) -> torch.Tensor:
+        """Returns a LongTensor of shape `size` of independent draws."""
+        cols = torch.randint(len(self.accept), size)
+        keep = torch.rand(cols.shape) < self.accept[cols]
+        return torch.where(keep, cols, self.alias[cols])
@@ -0,0 +1,316 @@
+import os
+import numpy as np
+import multiprocessing as mp
+from itertools import chain
+from typing import List, Optional, Sequence
+
+
+class CSRAdjacency:
+    """The out-adjacency of a graph in compressed sparse row (CSR) format.
+
+    The out-neighbors of node `u` are `indices[indptr[u]:indptr[u + 1]]`,
+    sorted by node id.
+
+    Args:
+        indptr (np.ndarray): Row pointer, of length `num_nodes + 1`.
+        indices (np.ndarray): Concatenated (sorted) neighbor lists.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.num_nodes = len(indptr) - 1
+        self.degrees = np.diff(indptr)
+        self._keys = None
+
+    @classmethod
+    def from_tugraph(cls, db) -> "CSRAdjacency":
+        """Reads the out-neighbors of all vertices through one read transaction."""
+        txn = db.CreateReadTxn()
+        vit = txn.GetVertexIterator()
+
+        vids = []
+        nbr_lists = []
+        while vit.IsValid():
+            vids.append(vit.GetId())
+            nbr_lists.append(vit.ListDstVids()[0])
+            vit.Next()
+
+        txn.Commit()
+
+        counts = np.array([len(nbrs) for nbrs in nbr_lists], dtype=np.int64)
+        src = np.repeat(np.array(vids, dtype=np.int64), counts)
+        dst = np.fromiter(chain.from_iterable(nbr_lists), np.int64, int(counts.sum()))
+        num_nodes = int(max(max(vids, default=-1), dst.max(initial=-1))) + 1
+
+        # sort by (src, dst) so that each row is sorted
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, dst[order])
+
+    def save(self, path: str):
+        """Saves the arrays as `.npy` files under the directory `path`."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "indptr.npy"), self.indptr)
+        np.save(os.path.join(path, "indices.npy"), self.indices)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CSRAdjacency":
+        """Loads a snapshot written by `save()`, memory-mapped if `mmap` is True."""
+        mmap_mode = "r" if mmap else None
+        return cls(
+            np.load(os.path.join(path, "indptr.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "indices.npy"), mmap_mode=mmap_mode),
+        )
+
+    def total_degrees(self) -> np.ndarray:
+        """Returns the out-degree plus the in-degree of every node."""
+        return self.degrees + np.bincount(self.indices, minlength=self.num_nodes)
+
+    def neighbors(self, node: int) -> np.ndarray:
+        """Returns the sorted out-neighbors of `node`."""
+        return self.indices[self.indptr[node] : self.indptr[node + 1]]
+
+    def has_edges(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """Vectorized edge test, returns a bool array of `src[i] -> dst[i]`."""
+        if self._keys is None:
+            # rows are sorted and each row is sorted,
+            # so the keys `row * num_nodes + col` are globally sorted
+            rows = np.repeat(np.arange(self.num_nodes, dtype=np.int64), self.degrees)
+            self._keys = rows * self.num_nodes + self.indices
+        keys = src * self.num_nodes + dst
+        if len(self._keys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.searchsorted(self._keys, keys)
+        pos[pos == len(self._keys)] = 0
+        return self._keys[pos] == keys
+
+
+class BatchedRandomWalker:
+    """
+    A node2vec random walker that advances many walks in lock-step with NumPy.
+
+    Instead of one Python loop per walk, each step of all walks is a few array
+    operations over the CSR adjacency. Biased transitions are drawn by
+    vectorized rejection sampling: propose a uniform neighbor for every walk,
+    accept with probability proportional to its 1, 1/p or 1/q weight,
+    and re-propose only for the rejected walks.
+
+    This walker implements `walk(start, length)` and `connected_nodes`,
+    so it can be used with `Node2VecTrainer`, and additionally
+    `walk_batch(starts, length)`, which the trainer prefers when available.
+
+    Args:
+    - adj (CSRAdjacency): The out-adjacency of the graph.
+    - p (float, optional): The return parameter. Defaults to 1.2.
+    - q (float, optional): The in-out parameter. Defaults to 2.0.
+    - seed (int, optional): Seed of the random generator. Defaults to `None`.
+    """
+
+    def __init__(
+        self,
+        adj: CSRAdjacency,
+        p: float = 1.2,
+        q: float = 2.0,
+        seed: Optional[int] = None,
+    ):
+        self.adj = adj
+        self.ret_p = p
+        self.io_q = q
+        self.rng = np.random.default_rng(seed)
+
+        self.connected_nodes = np.flatnonzero(adj.degrees > 0).tolist()
+
+    def _uniform_step(self, curr: np.ndarray) -> np.ndarray:
+        """Samples one uniform out-neighbor for each node in `curr`.
+        Nodes without out-edges stay where they are."""
+        deg = self.adj.degrees[curr]
+        if len(self.adj.indices) == 0:
+            return curr.copy()
+        offsets = (self.rng.random(len(curr)) * deg).astype(np.int64)
+        # clip so that dead ends at the end of `indices` do not index past it
+        pos = np.minimum(self.adj.indptr[curr] + offsets, len(self.adj.indices) - 1)
+        return np.where(deg > 0, self.adj.indices[pos], curr)
+
+    def _biased_step(self, prev: np.ndarray, curr: np.ndarray) -> np.ndarray:
+        """Samples the next node of each walk given its (prev, curr) nodes."""
+        w_return, w_inout = 1 / self.ret_p, 1 / self.io_q
+        w_max = max(w_return, 1.0, w_inout)
+
+        nexts = np.empty_like(curr)
+        pending = np.arange(len(curr))
+        while len(pending) > 0:
+            p_prev, p_curr = prev[pending], curr[pending]
+            cand = self._uniform_step(p_curr)
+
+            weight = np.where(self.adj.has_edges(p_prev, cand), 1.0, w_inout)
+            weight[cand == p_prev] = w_return
+            # dead ends (cand == curr without a self-loop) are always accepted
+            weight[self.adj.degrees[p_curr] == 0] = w_max
+
+            accept = self.rng.random(len(pending)) * w_max < weight
+            nexts[pending[accept]] = cand[accept]
+            pending = pending[~accept]
+        return nexts
+
+    def walk_batch(self, starts: Sequence[int], length: int) -> np.ndarray:
+        """Performs one random walk of length `length` from each node in `starts`.
+
+        Returns:
+            np.ndarray: An int64 array of shape (len(starts), length).
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        walks = np.empty((len(starts), length), dtype=np.int64)
+        if length == 0:
+            return walks
+
+        walks[:, 0] = starts
+        unbiased = self.ret_p == 1 and self.io_q == 1
+        for t in range(1, length):
+            if t == 1 or unbiased:
+                walks[:, t] = self._uniform_step(walks[:, t - 1])
+            else:
+                walks[:, t] = self._biased_step(walks[:, t - 2], walks[:, t - 1])
+        return walks
+
+    def walk(self, start: int, length: int) -> List[int]:
+        """Perform a random walk of length `length`, starting from node `start`."""
+        return self.walk_batch([start], length)[0].tolist()
+
+
+# per-process state of the walk workers, set up by `_init_walk_worker`
+_worker_state = {}
+
+
+def _init_walk_worker(snapshot_path, p, q, buffer, n_walks, length):
+    """Attaches a worker to the memory-mapped snapshot and the shared walk buffer."""
+    adj = CSRAdjacency.load(snapshot_path, mmap=True)
+    _worker_state["walker"] = BatchedRandomWalker(adj, p, q)
+    _worker_state["walks"] = np.frombuffer(buffer, dtype=np.int64).reshape(
+        n_walks, length
+    )
+
+
+def _walk_chunk(task):
+    """Walks from `starts` with its own seed and writes the rows `lo:` in place."""
+    seed, lo, starts = task
+    walker = _worker_state["walker"]
+    walker.rng = np.random.default_rng(seed)
+    walks = _worker_state["walks"]
+    walks[lo : lo + len(starts)] = walker.walk_batch(starts, walks.shape[1])
+
+
+class ParallelRandomWalker:
+    """
+    Generates batched node2vec walks with a pool of worker processes.
+
+    The start nodes are split into fixed-size chunks. Each worker attaches to the
+    same memory-mapped CSR snapshot (so the graph is shared through the page cache,
+    not copied) and writes its walks straight into a shared-memory buffer.
+    The pool and the buffer are created on the first call and reused as long as
+    the number and length of the walks do not change (e.g., across epochs).
+    Call `close()` to stop the workers.
+
+    Every chunk draws from its own random stream, derived from `seed`,
+    the index of the `walk_batch` call and the index of the chunk.
+    Since the chunking does not depend on `n_workers`,
+    the walks are identical for any number of workers.
+
+    Args:
+    - snapshot_path (str): Directory of a snapshot written by `CSRAdjacency.save`.
+    - p (float, optional): The return parameter. Defaults to 1.2.
+    - q (float, optional): The in-out parameter. Defaults to 2.0.
+    - seed (int, optional): Base random seed. Defaults to 0.
+    - n_workers (int, optional): Number of worker processes. Defaults to the
+      number of CPUs. With 1 worker, the walks are generated in-process.
+    - chunk_size (int, optional): Number of walks per task. Defaults to 4096.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        p: float = 1.2,
+        q: float = 2.0,
+        seed: int = 0,
+        n_workers: Optional[int] = None,
+        chunk_size: int = 4096,
+    ):
+        self.snapshot_path = snapshot_path
+        self.ret_p = p
+        self.io_q = q
+        self.seed = seed
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.n_calls = 0
+
+        self._walker = BatchedRandomWalker(
+            CSRAdjacency.load(snapshot_path, mmap=True), p, q
+        )
+        self.connected_nodes = self._walker.connected_nodes
+
+        # the worker pool and its shared (n_walks, length) walk buffer
+        self._pool = None
+        self._buffer = None
+        self._shape = None
+
+    def _get_pool(self, n_walks: int, length: int):
+        """Returns the pool, (re)created if the shape of the walks has changed."""
+        if self._pool is None or self._shape != (n_walks, length):
+            self.close()
+            self._buffer = mp.RawArray("q", n_walks * length)
+            self._shape = (n_walks, length)
+            initargs = (
+                self.snapshot_path,
+                self.ret_p,
+                self.io_q,
+                self._buffer,
+                n_walks,
+                length,
+            )
+            self._pool = mp.Pool(self.n_workers, _init_walk_worker, initargs)
+        return self._pool
+
+    def walk_batch(self, starts: Sequence[int], length: int) -> np.ndarray:
+        """Performs one random walk of length `length` from each node in `starts`.
+
+        Returns:
+            np.ndarray: An int64 array of shape (len(starts), length).
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        bounds = list(range(0, len(starts), self.chunk_size))
+        seeds = np.random.SeedSequence([self.seed, self.n_calls]).spawn(len(bounds))
+        tasks = [
+            (seed, lo, starts[lo : lo + self.chunk_size])
+            for seed, lo in zip(seeds, bounds)
+        ]
+        self.n_calls += 1
+
+        if self.n_workers <= 1 or len(tasks) <= 1:
+            walks = np.empty((len(starts), length), dtype=np.int64)
+            for seed, lo, chunk in tasks:
+                self._walker.rng = np.random.default_rng(seed)
+                walks[lo : lo + len(chunk)] = self._walker.walk_batch(chunk, length)
+            return walks
+
+        pool = self._get_pool(len(starts), length)
+        pool.map(_walk_chunk, tasks)
+        # copy, the buffer is overwritten by the next call
+        return (
+            np.frombuffer(self._buffer, dtype=np.int64)
+            .reshape(len(starts), length)
+            .copy()
+        )
+
+    def walk(self, start: int, length: int) -> List[int]:
+        """Perform a random walk of length `length`, starting from node `start`."""
+        return self.walk_batch([start], length)[0].tolist()
+
+    def close(self):
+        """Stops the worker processes, if any."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._buffer = None
+            self._shape = None
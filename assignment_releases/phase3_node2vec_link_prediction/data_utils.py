@@ -1,31 +1,48 @@
+import math
 import torch
-from torch.utils.data import Dataset
-from typing import List, Tuple, Optional
+from torch.utils.data import Dataset, Sampler
+from typing import List, Tuple, Optional, Union
 
 
 class LinkPredictionDataset(Dataset):
     """A torch `Dataset` for link prediction tasks.
 
+    The sources, destinations and labels are stored as contiguous tensors
+    `src`, `dst` and `labels`. Indexing with an int returns one `(src, dst, label)`
+    sample of Python ints, so the default `DataLoader` batching works as usual.
+    Indexing with a tensor of indices (or a slice) returns a whole batch of
+    three tensors: use it with a `BatchIndexSampler` (as the `sampler`, with
+    `batch_size=None`) and `LinkPredictionCollator` to index the dataset
+    once per batch.
+
     Args:
-        data (List[Tuple[int, int]]): A list of (src, dst) tuples.
+        data (List[Tuple[int, int]]): A list of (src, dst) tuples,
+            or an (n, 2) tensor.
         labels (List[int], optional): A list of labels.
             Defaults to `None`, which means no provided labels.
             If is `None`, the labels will be set to -1.
     """
 
-    def __init__(self, data: List[Tuple[int, int]], labels: Optional[List[int]] = None):
-        self.data = data
+    def __init__(
+        self,
+        data: Union[List[Tuple[int, int]], torch.Tensor],
+        labels: Optional[List[int]] = None,
+    ):
+        pairs = torch.as_tensor(data, dtype=torch.long).view(-1, 2)
+        self.src = pairs[:, 0].contiguous()
+        self.dst = pairs[:, 1].contiguous()
         if labels is None:
-            labels = [-1] * len(data)
-        self.labels = labels
+            self.labels = torch.full((len(pairs),), -1, dtype=torch.long)
+        else:
+            self.labels = torch.as_tensor(labels)
 
     def __len__(self):
-        return len(self.data)
+        return len(self.src)
 
-    def __getitem__(self, idx: int):
-        src, dst = self.data[idx]
-        label = self.labels[idx]
-        return src, dst, label
+    def __getitem__(self, idx: Union[int, slice, torch.Tensor]):
+        if isinstance(idx, (slice, torch.Tensor)):
+            return self.src[idx], self.dst[idx], self.labels[idx]
+        return self.src[idx].item(), self.dst[idx].item(), self.labels[idx].item()
 
 
 class LinkPredictionCollator:
@@ -33,8 +50,69 @@ class LinkPredictionCollator:
 
     This collator should be used with `LinkPredictionDataset` and torch `DataLoader`.
     It collates a batch into three Tensors: srcs, dsts, and labels.
+    A batch that the dataset already gathered into three tensors is passed through.
     """
 
     def __call__(self, batch):
+        if isinstance(batch, tuple) and all(
+            isinstance(t, torch.Tensor) and t.dim() == 1 for t in batch
+        ):
+            srcs, dsts, labels = batch
+            return srcs.long(), dsts.long(), labels.float()
+
         srcs, dsts, labels = zip(*batch)
-        return torch.LongTensor(srcs), torch.LongTensor(dsts), torch.FloatTensor(labels)
+        return (
+            torch.as_tensor(srcs, dtype=torch.long),
+            torch.as_tensor(dsts, dtype=torch.long),
+            torch.as_tensor(labels, dtype=torch.float),
+        )
+
+
+class BatchIndexSampler(Sampler):
+    """A sampler that yields whole batches of indices as `LongTensor`s.
+
+    Use it as the `sampler` of a `DataLoader` with `batch_size=None`,
+    so that the dataset is indexed once per batch instead of once per sample.
+
+    Args:
+        n (int): Number of samples.
+        batch_size (int): Number of indices per batch.
+        shuffle (bool, optional): Shuffles the indices every epoch. Defaults to False.
+    """
+
+    def __init__(self, n: int, batch_size: int, shuffle: bool = False):
+        self.n = n
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __iter__(self):
+        indices = torch.randperm(self.n) if self.shuffle else torch.arange(self.n)
+        return iter(indices.split(self.batch_size))
+
+    def __len__(self):
+        return math.ceil(self.n / self.batch_size)
+
+
+class WalkWindowDataset(Dataset):
+    """A torch `Dataset` of sliding windows over random walk trajectories.
+
+    The windows are a strided view (`Tensor.unfold`) of the trajectories,
+    so they are never materialized. Indexing with a tensor of indices
+    gathers a whole (B, window_size) batch at once.
+
+    Args:
+        trajectories (torch.Tensor): A (num_walks, walk_length) LongTensor.
+        window_size (int): Number of nodes in each window.
+    """
+
+    def __init__(self, trajectories: torch.Tensor, window_size: int):
+        self.trajectories = trajectories
+        # (num_walks, n_windows, window_size), sharing storage with trajectories
+        self.windows = trajectories.unfold(1, window_size, 1)
+        self.n_windows = self.windows.shape[1]
+
+    def __len__(self):
+        return self.windows.shape[0] * self.n_windows
+
+    def __getitem__(self, idx: Union[int, torch.Tensor]) -> torch.Tensor:
+        return self.windows[idx // self.n_windows, idx % self.n_windows]
@@ -0,0 +1,305 @@
+import math
+import torch
+import numpy as np
+from typing import Optional, Sequence, Tuple, Union
+
+from batch_walker import CSRAdjacency
+
+
+def _kmeans(
+    x: torch.Tensor, n_clusters: int, n_iter: int, generator: torch.Generator
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Lloyd's k-means. Returns the (n_clusters, D) centroids and the assignments.
+
+    Centroids are initialized with random points. A cluster that becomes empty
+    keeps its previous centroid.
+    """
+    init = torch.randperm(len(x), generator=generator)[:n_clusters]
+    centroids = x[init].clone()
+    for it in range(n_iter + 1):
+        # argmin ||x - c||^2 = argmax 2 x.c - ||c||^2
+        assign = (2 * x @ centroids.T - (centroids**2).sum(1)).argmax(dim=1)
+        if it == n_iter:
+            break
+        sums = torch.zeros_like(centroids).index_add_(0, assign, x)
+        counts = torch.bincount(assign, minlength=n_clusters)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty].unsqueeze(1)
+    return centroids, assign
+
+
+class ExactLinkIndex:
+    """Recommends the top-k most likely new links of nodes by exact search.
+
+    The score of a link `u -> v` is the dot product of their embeddings, as in
+    `SigmoidPredictionHead` (apply `torch.sigmoid` to get probabilities).
+    Queries are scored in blocks with one matrix multiplication each,
+    so memory is bounded by `block_size * num_nodes` scores.
+
+    A node itself and, if `adj` is given, its existing out-neighbors
+    are never recommended.
+
+    Args:
+        embeddings (torch.Tensor): The (num_nodes, D) node embeddings,
+            e.g., `model.node_embeddings.weight`.
+        adj (CSRAdjacency, optional): The out-adjacency of the graph.
+            Defaults to `None`, i.e., only the node itself is excluded.
+        block_size (int, optional): Number of queries per block. Defaults to 1024.
+    """
+
+    def __init__(
+        self,
+        embeddings: torch.Tensor,
+        adj: Optional[CSRAdjacency] = None,
+        block_size: int = 1024,
+    ):
+        self.embeddings = embeddings.detach().float().contiguous()
+        self.num_nodes = len(embeddings)
+        self.adj = adj
+        self.block_size = block_size
+
+    def _known_links(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns `(rows, cols)`, such that `nodes[rows[i]] -> cols[i]` are
+        all existing out-edges of `nodes`."""
+        if self.adj is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        # nodes without a row in the adjacency have no out-edges
+        in_graph = nodes < self.adj.num_nodes
+        rows_of = np.where(in_graph, nodes, 0)
+        counts = np.where(in_graph, self.adj.degrees[rows_of], 0)
+        starts = self.adj.indptr[rows_of]
+
+        rows = np.repeat(np.arange(len(nodes)), counts)
+        # position of each edge within its row
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        cols = self.adj.indices[np.repeat(starts, counts) + offsets]
+        return rows, cols
+
+    def _mask_known(self, scores: torch.Tensor, nodes: torch.Tensor):
+        """Sets the scores of the nodes themselves and of existing links to -inf."""
+        scores[torch.arange(len(nodes)), nodes] = -math.inf
+        rows, cols = self._known_links(nodes.numpy())
+        scores[torch.from_numpy(rows), torch.from_numpy(cols)] = -math.inf
+
+    @staticmethod
+    def _empty_results(n: int, k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        return torch.full((n, k), -math.inf), torch.full((n, k), -1, dtype=torch.long)
+
+    def query(
+        self, nodes: Union[Sequence[int], torch.Tensor], k: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Finds the top-k new links of each node in `nodes`.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: `(scores, ids)`, both of shape
+                (len(nodes), k), sorted by descending score. If a node has fewer
+                than k candidates, the remaining ids are -1 with score -inf.
+        """
+        nodes = torch.as_tensor(nodes, dtype=torch.long)
+        k = min(k, self.num_nodes)
+        top_scores, top_ids = self._empty_results(len(nodes), k)
+
+        with torch.inference_mode():
+            for lo in range(0, len(nodes), self.block_size):
+                block = nodes[lo : lo + self.block_size]
+                # (block_size, num_nodes)
+                scores = self.embeddings[block] @ self.embeddings.T
+                self._mask_known(scores, block)
+                values, ids = scores.topk(k, dim=1)
+                top_scores[lo : lo + len(block)] = values
+                top_ids[lo : lo + len(block)] = ids
+
+        top_ids[top_scores == -math.inf] = -1
+        return top_scores, top_ids
+
+    def query_all(self, k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Finds the top-k new links of every node, see `query()`."""
+        return self.query(torch.arange(self.num_nodes), k)
+
+
+class IVFPQLinkIndex(ExactLinkIndex):
+    """Recommends the top-k most likely new links of nodes by approximate search,
+    with an inverted file (IVF) and product quantization (PQ) (Jegou et al., 2011).
+
+    The nodes are clustered around `n_lists` coarse centroids. The residual of
+    each embedding to its centroid is split into `n_subvectors` parts, and each
+    part is stored as a one-byte code of its nearest sub-centroid.
+    A query only visits the nodes of its `n_probe` best-scoring lists and scores
+    them from lookup tables of the codes, without touching the full embeddings.
+
+    The PQ scores are approximate, so by default a shortlist of the best candidates
+    is re-scored exactly. Queries are processed in blocks of `block_size`,
+    and the memory of a block grows with `block_size * n_probe * num_nodes / n_lists`.
+
+    Recall depends on `n_probe` (are the true neighbors in a probed list?),
+    on `refine_factor` (do they survive the PQ shortlist?), and on the embeddings:
+    without cluster structure (e.g., i.i.d. Gaussian vectors) the true neighbors
+    are spread over many lists. Measure recall@k against `ExactLinkIndex` on a
+    sample of queries, and raise `n_probe` (up to `n_lists`, which is exact search
+    over the PQ codes) until it is high enough, or use `ExactLinkIndex`,
+    which is as fast on graphs of this size.
+
+    Args:
+        embeddings (torch.Tensor): The (num_nodes, D) node embeddings.
+        adj (CSRAdjacency, optional): The out-adjacency of the graph.
+            Existing out-neighbors are never recommended. Defaults to `None`.
+        n_lists (int, optional): Number of inverted lists.
+            Defaults to `4 * sqrt(num_nodes)`.
+        n_subvectors (int, optional): Number of PQ sub-vectors, must divide D.
+            Defaults to 8.
+        n_probe (int, optional): Number of lists visited per query. Defaults to 16.
+        refine_factor (int, optional): If positive, the best `k * refine_factor`
+            candidates are re-scored with the exact embeddings. Defaults to 16.
+        n_iter (int, optional): Number of k-means iterations. Defaults to 20.
+        seed (int, optional): Seed of the k-means initialization. Defaults to 0.
+        block_size (int, optional): Number of queries per block. Defaults to 1024.
+    """
+
+    def __init__(
+        self,
+        embeddings: torch.Tensor,
+        adj: Optional[CSRAdjacency] = None,
+        n_lists: Optional[int] = None,
+        n_subvectors: int = 8,
+        n_probe: int = 16,
+        refine_factor: int = 16,
+        n_iter: int = 20,
+        seed: int = 0,
+        block_size: int = 1024,
+    ):
+        super().__init__(embeddings, adj, block_size)
+        dim = self.embeddings.shape[1]
+        if dim % n_subvectors != 0:
+            raise ValueError(
+                f"n_subvectors ({n_subvectors}) must divide the embedding dim ({dim})."
+            )
+        if n_lists is None:
+            n_lists = int(4 * math.sqrt(self.num_nodes))
+        self.n_lists = max(1, min(n_lists, self.num_nodes))
+        self.n_subvectors = n_subvectors
+        self.n_probe = n_probe
+        self.refine_factor = refine_factor
+
+        generator = torch.Generator().manual_seed(seed)
+        x = self.embeddings
+
+        # coarse quantizer, the members of list l are `members[ptr[l]:ptr[l + 1]]`
+        self.centroids, assign = _kmeans(x, self.n_lists, n_iter, generator)
+        self.members = assign.argsort()
+        self.list_ptr = torch.zeros(self.n_lists + 1, dtype=torch.long)
+        torch.cumsum(
+            torch.bincount(assign, minlength=self.n_lists), 0, out=self.list_ptr[1:]
+        )
+
+        # product quantizer of the residuals, one codebook per sub-vector
+        residuals = (x - self.centroids[assign]).view(self.num_nodes, n_subvectors, -1)
+        n_codes = min(256, self.num_nodes)
+        codebooks, codes = [], []
+        for m in range(n_subvectors):
+            book, code = _kmeans(
+                residuals[:, m].contiguous(), n_codes, n_iter, generator
+            )
+            codebooks.append(book)
+            codes.append(code)
+        # (n_subvectors, n_codes, D / n_subvectors)
+        self.codebooks = torch.stack(codebooks)
+        # (num_nodes, n_subvectors), stored in list order
+        self.codes = torch.stack(codes, dim=1).to(torch.uint8)[self.members]
+
+    def query(
+        self, nodes: Union[Sequence[int], torch.Tensor], k: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Finds the approximate top-k new links of each node in `nodes`.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: `(scores, ids)`, see
+                `ExactLinkIndex.query()`.
+        """
+        nodes = torch.as_tensor(nodes, dtype=torch.long)
+        k = min(k, self.num_nodes)
+        top_scores, top_ids = self._empty_results(len(nodes), k)
+
+        with torch.inference_mode():
+            for lo in range(0, len(nodes), self.block_size):
+                block = nodes[lo : lo + self.block_size]
+                self._query_block(block, k, top_scores[lo:], top_ids[lo:])
+
+        top_ids[top_scores == -math.inf] = -1
+        return top_scores, top_ids
+
+    def _query_block(
+        self,
+        nodes: torch.Tensor,
+        k: int,
+        top_scores: torch.Tensor,
+        top_ids: torch.Tensor,
+    ):
+        """Writes the results of `nodes` into the first rows of `top_scores/ids`.
+
+        All (query, probed list) pairs of the block are expanded at once into
+        one flat array of candidates, grouped by query, which is scored from
+        the lookup tables with a single gather and padded into a
+        (len(nodes), max candidates) matrix for `topk`.
+        """
+        n = len(nodes)
+        n_probe = min(self.n_probe, self.n_lists)
+        sub_ids = torch.arange(self.n_subvectors)
+        list_sizes = self.list_ptr[1:] - self.list_ptr[:-1]
+
+        queries = self.embeddings[nodes]
+        # (n, n_lists) scores of the centroids, the best ones are probed
+        coarse = queries @ self.centroids.T
+        probe_scores, probes = coarse.topk(n_probe, dim=1)
+        # (n, n_subvectors, n_codes) lookup tables, q . codeword per sub-vector
+        luts = torch.einsum(
+            "bmd,mkd->bmk",
+            queries.view(n, self.n_subvectors, -1),
+            self.codebooks,
+        )
+
+        # positions (in list order) of all members of the probed lists,
+        # for every query: the candidates of query i are contiguous
+        sizes = list_sizes[probes].reshape(-1)
+        starts = self.list_ptr[probes].reshape(-1)
+        n_cands = int(sizes.sum())
+        pos = torch.repeat_interleave(starts - torch.cumsum(sizes, 0) + sizes, sizes)
+        pos += torch.arange(n_cands)
+        per_query = list_sizes[probes].sum(dim=1)
+        rows = torch.repeat_interleave(torch.arange(n), per_query)
+        cols = torch.arange(n_cands) - torch.repeat_interleave(
+            torch.cumsum(per_query, 0) - per_query, per_query
+        )
+
+        # q . x ~= q . centroid + sum_m q_m . codeword_m
+        scores = torch.repeat_interleave(probe_scores.reshape(-1), sizes)
+        scores += luts[rows.unsqueeze(1), sub_ids, self.codes[pos].long()].sum(dim=1)
+
+        # the nodes themselves and their existing out-neighbors are never returned
+        cands = self.members[pos]
+        known = cands == nodes[rows]
+        known_rows, known_cols = self._known_links(nodes.numpy())
+        if len(known_rows) > 0:
+            known_keys = known_rows * self.num_nodes + known_cols
+            cand_keys = (rows * self.num_nodes + cands).numpy()
+            known |= torch.from_numpy(np.isin(cand_keys, known_keys))
+        scores[known] = -math.inf
+
+        width = int(per_query.max()) if n > 0 else 0
+        padded = torch.full((n, width), -math.inf)
+        padded[rows, cols] = scores
+        padded_ids = torch.zeros((n, width), dtype=torch.long)
+        padded_ids[rows, cols] = cands
+
+        if self.refine_factor > 0:
+            # re-score a shortlist with the exact embeddings
+            shortlist, idx = padded.topk(min(k * self.refine_factor, width), dim=1)
+            padded_ids = padded_ids.gather(1, idx)
+            padded = torch.einsum(
+                "bd,brd->br", queries, self.embeddings[padded_ids]
+            ).masked_fill(shortlist == -math.inf, -math.inf)
+
+        values, idx = padded.topk(min(k, padded.shape[1]), dim=1)
+        top_scores[:n, : values.shape[1]] = values
+        top_ids[:n, : values.shape[1]] = padded_ids.gather(1, idx)
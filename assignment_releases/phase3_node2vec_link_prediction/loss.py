@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch import Tensor
 
 
@@ -51,3 +52,74 @@ class NegativeSamplingLoss(nn.Module):
 
         # return loss
         return loss
+
+
+class _FusedNegativeSampling(torch.autograd.Function):
+    """Negative sampling loss with a hand-written backward.
+
+    The scores are computed with `bmm`, so no (B, n, H) products of the
+    embeddings are materialized. Only the (B, n) sigmoids are saved for the
+    backward pass, which forms the gradients with `bmm` as well.
+    """
+
+    @staticmethod
+    def forward(ctx, cur_embs: Tensor, pos_embs: Tensor, neg_embs: Tensor) -> Tensor:
+        B = cur_embs.shape[0]
+        n_pos, n_neg = pos_embs.shape[1], neg_embs.shape[1]
+        cur_col = cur_embs.unsqueeze(2)
+
+        # (B, n_pos) and (B, n_neg)
+        pos_scores = torch.bmm(pos_embs, cur_col).squeeze(2)
+        neg_scores = torch.bmm(neg_embs, cur_col).squeeze(2)
+
+        # logsigmoid never evaluates log(0), unlike log(sigmoid(x) + eps)
+        loss = -(
+            F.logsigmoid(pos_scores).sum() / (B * n_pos)
+            + F.logsigmoid(-neg_scores).sum() / (B * n_neg)
+        )
+
+        # d loss / d score, (B, n_pos) and (B, n_neg)
+        pos_coef = torch.sigmoid(-pos_scores).div_(-B * n_pos)
+        neg_coef = torch.sigmoid(neg_scores).div_(B * n_neg)
+        ctx.save_for_backward(cur_embs, pos_embs, neg_embs, pos_coef, neg_coef)
+        return loss
+
+    @staticmethod
+    def backward(ctx, grad_loss: Tensor):
+        cur_embs, pos_embs, neg_embs, pos_coef, neg_coef = ctx.saved_tensors
+        pos_coef = pos_coef * grad_loss
+        neg_coef = neg_coef * grad_loss
+
+        grad_cur = grad_pos = grad_neg = None
+        if ctx.needs_input_grad[0]:
+            # (B, 1, n) @ (B, n, H) -> (B, H)
+            grad_cur = (
+                torch.bmm(pos_coef.unsqueeze(1), pos_embs)
+                + torch.bmm(neg_coef.unsqueeze(1), neg_embs)
+            ).squeeze(1)
+        if ctx.needs_input_grad[1]:
+            # (B, n_pos, 1) @ (B, 1, H) -> (B, n_pos, H)
+            grad_pos = torch.bmm(pos_coef.unsqueeze(2), cur_embs.unsqueeze(1))
+        if ctx.needs_input_grad[2]:
+            grad_neg = torch.bmm(neg_coef.unsqueeze(2), cur_embs.unsqueeze(1))
+        return grad_cur, grad_pos, grad_neg
+
+
+class FusedNegativeSamplingLoss(nn.Module):
+    """A fused and numerically stable negative sampling loss.
+
+    For each current node `c`, its positive samples `p` and negative samples `n`,
+    the loss is `-mean(log(sigmoid(c . p))) - mean(log(sigmoid(-c . n)))`,
+    averaged over the batch. It takes the same inputs as `NegativeSamplingLoss`.
+    """
+
+    def forward(
+        self,
+        cur_embs: torch.Tensor,
+        pos_embs: torch.Tensor,
+        neg_embs: torch.Tensor,
+    ) -> Tensor:
+        B, H = cur_embs.shape
+        pos_embs = pos_embs.reshape(B, -1, H)
+        neg_embs = neg_embs.reshape(B, -1, H)
+        return _FusedNegativeSampling.apply(cur_embs, pos_embs, neg_embs)
@@ -4,16 +4,20 @@ import torch.nn.functional as F
 
 
 class Node2Vec(nn.Module):
-    def __init__(self, in_dim: int, emb_dim: int):
+    def __init__(self, in_dim: int, emb_dim: int, sparse: bool = False):
         """The Node2Vec model for learning node embeddings.
         It is essentially a simple layer of `nn.Embedding`.
 
         Args:
             in_dim (int): Input dimension, should be number of nodes.
             emb_dim (int): Embedding dimension.
+            sparse (bool, optional): If True, the gradient of the embeddings is a
+                sparse tensor that only holds the rows used in the batch.
+                Requires a sparse-aware optimizer, such as `optim.SparseAdam`.
+                Defaults to False.
         """
         super().__init__()
-        self.node_embeddings = nn.Embedding(in_dim, emb_dim)
+        self.node_embeddings = nn.Embedding(in_dim, emb_dim, sparse=sparse)
         self._normalize_parameters()
 
     def _normalize_parameters(self):
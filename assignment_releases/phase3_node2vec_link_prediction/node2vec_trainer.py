@@ -1,11 +1,21 @@
+import os
+import queue
 import torch
+import threading
+import traceback
+import numpy as np
+import torch.nn as nn
 import torch.optim as optim
+import torch.multiprocessing as mp
 import warnings
 
 from tqdm import tqdm
+from typing import Optional
 from torch.utils.data import DataLoader
 
 from model import Node2Vec
+from alias import AliasSampler
+from data_utils import BatchIndexSampler, WalkWindowDataset
 from walker import BiasedRandomWalker
 from loss import NegativeSamplingLoss
 
@@ -20,6 +30,8 @@ class Node2VecTrainer:
       This walker should implement:
         1. a `walk(start, length)` method that returns a walk of length `length` starting from `start`.
         2. a `connected_nodes` attribute that lists all nodes with at least one edge.
+      If the walker also implements `walk_batch(starts, length)` (e.g., `BatchedRandomWalker`),
+      all walks of an epoch are generated with a single call.
     - `n_negs` (int): Number of negative samples to be used in negative sampling.
     - `n_epochs` (int): Number of epochs to train the model.
     - `batch_size` (int): Batch size for training.
@@ -28,6 +40,20 @@ class Node2VecTrainer:
     - `walk_length` (int): Length of each random walk session. Defaults to 15.
     - `window_size` (int): Window size for each training sample Defaults to 7.
     - `n_walks_per_node` (int): Number of walks to start from each node. Defaults to 1.
+    - `prefetch_epochs` (int): Number of epochs of random walks a background thread
+      may generate ahead of training. Defaults to 0, i.e., walk and train in turns.
+    - `neg_freqs` (torch.Tensor): Frequency of each node, e.g., its degree or the
+      output of `walk_frequencies()`. If given, negatives are drawn proportional
+      to `neg_freqs ** neg_power`, see `set_neg_freqs()`. Defaults to `None`,
+      i.e., negatives are drawn uniformly from all nodes.
+    - `neg_power` (float): Exponent applied to `neg_freqs`. Defaults to 0.75.
+    - `reject_contexts` (bool): Redraw negatives that are nodes of their own window.
+      Defaults to False.
+    - `skip_gram` (bool): Use every node of a window as a center node, with the
+      other nodes of the window as its contexts, instead of only the first node.
+      Each window then yields `window_size` training samples. Defaults to False.
+    - `loss_func` (nn.Module): The loss, called with the current, positive and
+      negative embeddings. Defaults to `NegativeSamplingLoss()`.
     """
 
     def __init__(
@@ -43,10 +69,20 @@ class Node2VecTrainer:
         walk_length: int = 15,
         window_size: int = 7,
         n_walks_per_node: int = 1,
+        prefetch_epochs: int = 0,
+        neg_freqs: Optional[torch.Tensor] = None,
+        neg_power: float = 0.75,
+        reject_contexts: bool = False,
+        skip_gram: bool = False,
+        loss_func: Optional[nn.Module] = None,
     ):
         self.num_nodes = num_nodes
         self.model = model
         self.n_negs = n_negs
+        self.reject_contexts = reject_contexts
+        self.neg_sampler = None
+        if neg_freqs is not None:
+            self.set_neg_freqs(neg_freqs, neg_power)
 
         self.walker = walker
         self.walk_length = walk_length
@@ -56,12 +92,21 @@ class Node2VecTrainer:
             warnings.warn("Window size should be odd. Adding 1 to window size.")
         self.window_size = (window_size // 2) * 2 + 1
 
+        self.skip_gram = skip_gram
+        # row i holds the positions of the contexts of position i in a window,
+        # i.e., all positions but i, (window_size, window_size - 1)
+        positions = torch.arange(self.window_size).repeat(self.window_size, 1)
+        self._context_index = positions[
+            ~torch.eye(self.window_size, dtype=torch.bool)
+        ].view(self.window_size, -1)
+
         self.n_epochs = n_epochs
         self.batch_size = batch_size
         self.device = device
+        self.prefetch_epochs = prefetch_epochs
 
         self.optimizer = self.create_optimizer(lr)
-        self.loss_func = NegativeSamplingLoss()
+        self.loss_func = loss_func if loss_func is not None else NegativeSamplingLoss()
 
     def _get_random_walk(self):
         """
@@ -70,57 +115,146 @@ class Node2VecTrainer:
         and returns a wrapped `DataLoader` for training.
         """
         walk_len = self.walk_length
-        context_sz = self.window_size // 2
 
         # first perform random walks of length `walk_length`,
         # starting from each node in `connected_nodes`
         # and store the walks in `trajectories`
-        trajectories = []
-        for node in self.walker.connected_nodes:
-            for _ in range(self.n_walks_per_node):
-                trajectory = self.walker.walk(node, walk_len)
-                trajectories.append(trajectory)
+        if hasattr(self.walker, "walk_batch"):
+            # batched walkers advance all walks at once with array operations
+            starts = np.repeat(self.walker.connected_nodes, self.n_walks_per_node)
+            trajectories = torch.from_numpy(self.walker.walk_batch(starts, walk_len))
+        else:
+            trajectories = []
+            for node in self.walker.connected_nodes:
+                for _ in range(self.n_walks_per_node):
+                    trajectory = self.walker.walk(node, walk_len)
+                    trajectories.append(trajectory)
+            trajectories = torch.LongTensor(trajectories)
 
         # then convert the walks into training samples
-        # we use a sliding window to extract training samples from each trajectory
-        walks = []
-        for trajectory in trajectories:
-            for cent in range(context_sz, walk_len - context_sz):
-                walks.append(trajectory[cent - context_sz : cent + context_sz + 1])
+        # we use a sliding window to extract training samples from each trajectory,
+        # the windows are a strided view of `trajectories` and are never copied
+        walks = WalkWindowDataset(trajectories, self.window_size)
+
+        # finally wrap the training samples into a DataLoader,
+        # which gathers a whole shuffled batch of windows at a time
+        sampler = BatchIndexSampler(len(walks), self.batch_size, shuffle=True)
+        return DataLoader(walks, batch_size=None, sampler=sampler)
+
+    def set_neg_freqs(self, freqs: torch.Tensor, power: float = 0.75):
+        """Draws negatives proportional to `freqs ** power` from now on.
+
+        This is the unigram^0.75 distribution of word2vec: frequent nodes are
+        drawn more often, but less than in proportion to their frequency.
+        Nodes with zero frequency, such as isolated nodes, are never drawn.
+        """
+        self.neg_sampler = AliasSampler(freqs.double() ** power)
+
+    def walk_frequencies(self) -> torch.Tensor:
+        """Performs one session of random walks and returns how many times
+        each node occurs in them, to be used with `set_neg_freqs()`."""
+        trajectories = self._get_random_walk().dataset.trajectories
+        return torch.bincount(trajectories.flatten(), minlength=self.num_nodes)
 
-        # finally wrap the training samples into a DataLoader
-        walks = torch.LongTensor(walks)
-        return DataLoader(walks, batch_size=self.batch_size, shuffle=True)
+    def _draw_nodes(self, size) -> torch.Tensor:
+        """Draws nodes from the negative sampling distribution."""
+        if self.neg_sampler is None:
+            return torch.randint(self.num_nodes, size)
+        return self.neg_sampler.sample(size)
 
-    def _sample_neg_nodes(self, batch_sz: int, window_sz: int, n_negs: int):
+    def _sample_neg_nodes(
+        self,
+        batch_sz: int,
+        window_sz: int,
+        n_negs: int,
+        windows: Optional[torch.Tensor] = None,
+    ):
         """Returns a batch of negative samples, to be used for NegativeSamplingLoss.
 
         Args:
         - batch_sz (int): Batch size.
         - window_sz (int): Window size.
         - n_negs (int): Number of negative samples to be used.
+        - windows (torch.Tensor, optional): The (batch_sz, *) window of each sample.
+          If given and `reject_contexts` is set, negatives that are nodes
+          of their own window are redrawn.
 
-        NOTE: We simply randomly sample from all nodes and ignore the fact that
-        we might accidentally include positive edges during sampling.
+        NOTE: Without `reject_contexts`, we ignore the fact that we might
+        accidentally include positive edges during sampling.
         Since the graph is sparse, this should not cause much trouble.
         """
-        return torch.randint(self.num_nodes, (batch_sz, window_sz * n_negs))
+        neg_nodes = self._draw_nodes((batch_sz, window_sz * n_negs))
+        if windows is None or not self.reject_contexts:
+            return neg_nodes
+
+        # a bounded number of rounds, in case a window holds most of the mass
+        for _ in range(10):
+            # (B, window_sz * n_negs)
+            hits = (neg_nodes.unsqueeze(2) == windows.unsqueeze(1)).any(dim=2)
+            n_hits = int(hits.sum())
+            if n_hits == 0:
+                break
+            neg_nodes[hits] = self._draw_nodes((n_hits,))
+        return neg_nodes
 
-    def _train_one_epoch(self, eid: int):
+    def _prefetch_random_walks(self):
         """
-        Perform one epoch of training.
-        We first perform random walk to generate training samples,
-        then train the model using these samples.
+        Yields the `DataLoader` of each epoch, while a background thread
+        performs the random walks of the upcoming epochs.
+
+        The producer thread may run at most `prefetch_epochs` epochs ahead
+        (bounded by the queue size), so epoch N+1 is walked while epoch N trains.
         """
-        tot_loss = 0
-        prog = tqdm(self._get_random_walk())
-        for bid, batch in enumerate(prog):
-            self.optimizer.zero_grad()
+        loaders = queue.Queue(maxsize=self.prefetch_epochs)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for _ in range(self.n_epochs):
+                    if stop.is_set():
+                        return
+                    loaders.put(self._get_random_walk())
+            except Exception as e:  # re-raised in the training thread
+                loaders.put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            for _ in range(self.n_epochs):
+                loader = loaders.get()
+                if isinstance(loader, Exception):
+                    raise loader
+                yield loader
+        finally:
+            # unblock the producer if training stops early
+            stop.set()
+            while producer.is_alive():
+                try:
+                    loaders.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.1)
+
+    def _train_step(self, batch: torch.Tensor) -> float:
+        """Performs one optimization step on a batch of windows, returns the loss."""
+        self.optimizer.zero_grad()
 
-            batch = batch.to(self.device)
-            B = batch.shape[0]  # batch size
-            L = batch.shape[1]  # window size
+        windows = batch  # kept on the CPU, where the negatives are drawn
+        batch = batch.to(self.device)
+        B = batch.shape[0]  # batch size
+        L = batch.shape[1]  # window size
 
+        if self.skip_gram:
+            # every node in the window is a current node,
+            # and the other nodes in the window are its positive samples
+            # (B * window_sz,)
+            currents = batch.reshape(-1)
+            # (B * window_sz, window_sz - 1)
+            contexts = batch[:, self._context_index.to(batch.device)].reshape(
+                B * L, L - 1
+            )
+            windows = windows.repeat_interleave(L, dim=0)
+            B = B * L
+        else:
             # we assume the first node in the walk is the current node
             # all subsequent nodes are positive samples
             # NOTE: strictly speaking, the middle node should be used as `current`
@@ -128,27 +262,43 @@ class Node2VecTrainer:
             currents = batch[:, 0]
             contexts = batch[:, 1:].contiguous()
 
-            # current node embeddings
-            # (B, D)
-            cur_embeddings = self.model(currents)
+        # current node embeddings
+        # (B, D)
+        cur_embeddings = self.model(currents)
 
-            # positive samples
-            # (B, window_sz, D)
-            pos_embeddings = self.model(contexts)
+        # positive samples
+        # (B, window_sz, D)
+        pos_embeddings = self.model(contexts)
 
-            # negative samples, choose window_sz * n_negs neg samples for each node
-            # (B, window_sz * n_negs)
-            neg_nodes = self._sample_neg_nodes(B, L, self.n_negs)
-            neg_nodes = neg_nodes.to(self.device)
-            # (B, window_sz * n_negs, D)
-            neg_embeddings = self.model(neg_nodes)
+        # negative samples, choose window_sz * n_negs neg samples for each node
+        # (B, window_sz * n_negs)
+        neg_nodes = self._sample_neg_nodes(B, L, self.n_negs, windows)
+        neg_nodes = neg_nodes.to(self.device)
+        # (B, window_sz * n_negs, D)
+        neg_embeddings = self.model(neg_nodes)
+
+        loss = self.loss_func(cur_embeddings, pos_embeddings, neg_embeddings)
+
+        loss.backward()
+        self.optimizer.step()
+
+        return loss.item()
 
-            loss = self.loss_func(cur_embeddings, pos_embeddings, neg_embeddings)
+    def _train_one_epoch(self, eid: int, loader: Optional[DataLoader] = None):
+        """
+        Perform one epoch of training.
+        We first perform random walk to generate training samples,
+        then train the model using these samples.
 
-            loss.backward()
-            self.optimizer.step()
+        If `loader` is given, its samples are used instead of a new random walk.
+        """
+        if loader is None:
+            loader = self._get_random_walk()
 
-            tot_loss += loss.item()
+        tot_loss = 0
+        prog = tqdm(loader)
+        for bid, batch in enumerate(prog):
+            tot_loss += self._train_step(batch)
             avg_loss = tot_loss / (bid + 1)
 
             prog.set_description(f"Epoch: {eid:2d}, Loss: {avg_loss:.4f}")
@@ -156,12 +306,169 @@ class Node2VecTrainer:
         print(f"Epoch: {eid:2d}, Loss: {avg_loss:.4f}")
 
     def create_optimizer(self, lr: float):
-        """Create an optimizer for training."""
+        """Create an optimizer for training.
+
+        With sparse embeddings (`Node2Vec(..., sparse=True)`), `SparseAdam` is used,
+        so that each step only updates the rows referenced by the batch.
+        """
+        if self.model.node_embeddings.sparse:
+            return optim.SparseAdam(list(self.model.parameters()), lr=lr)
         return optim.RMSprop(self.model.parameters(), lr=lr)
 
     def train(self):
         """Train the model for `n_epochs` epochs."""
 
         self.model.train()
-        for eid in range(self.n_epochs):
-            self._train_one_epoch(eid)
+        if self.prefetch_epochs > 0:
+            for eid, loader in enumerate(self._prefetch_random_walks()):
+                self._train_one_epoch(eid, loader)
+        else:
+            for eid in range(self.n_epochs):
+                self._train_one_epoch(eid)
+
+
+def _hogwild_worker(trainer: Node2VecTrainer, seed: int, tasks, results):
+    """Trains on the shards sent through `tasks` until it receives `None`.
+
+    The worker is forked from the trainer, so its model parameters are the
+    shared-memory tensors of the parent and every optimizer step writes to them
+    directly, without any locking.
+    """
+    # one thread per worker, the parallelism comes from the processes
+    torch.set_num_threads(1)
+    torch.manual_seed(seed)
+    try:
+        while True:
+            shard = tasks.get()
+            if shard is None:
+                return
+            tot_loss = 0
+            batches = shard.split(trainer.batch_size)
+            for batch in batches:
+                tot_loss += trainer._train_step(batch)
+            results.put((tot_loss, len(batches)))
+    except Exception:  # re-raised in the parent
+        # the formatted traceback can always be pickled, unlike some exceptions
+        results.put(RuntimeError(f"Hogwild worker failed:\n{traceback.format_exc()}"))
+
+
+class HogwildNode2VecTrainer(Node2VecTrainer):
+    """Trains `Node2Vec` with several processes that update the embeddings
+    lock-free, in the style of Hogwild! (Niu et al., 2011).
+
+    The model parameters are moved to shared memory and `n_workers` processes
+    are forked once, at the start of `train()`. In every epoch, the parent
+    performs the random walks, shuffles the windows and sends each worker its
+    own shard. The workers train on their shards concurrently and write their
+    updates straight into the shared embeddings.
+
+    Since each batch only touches a few rows of the embedding table, concurrent
+    updates rarely collide, and the occasional overwritten update does not hurt
+    convergence. Use a model with `sparse=True`, otherwise every step of every
+    worker writes the whole table.
+
+    NOTE: Each worker keeps its own optimizer state (e.g., the moments of
+    `SparseAdam`). Training runs on the CPU only.
+    If a worker raises, its traceback is re-raised in the parent. If a worker
+    dies (e.g., it is killed), the parent notices within `poll_interval` seconds
+    and raises as well, instead of waiting forever.
+
+    Args:
+    - `n_workers` (int): Number of training processes. Defaults to the number of CPUs.
+    - `poll_interval` (float): Seconds between two liveness checks of the workers
+      while waiting for their results. Defaults to 1.0.
+    - Other arguments are the same as `Node2VecTrainer`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        n_workers: Optional[int] = None,
+        poll_interval: float = 1.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if torch.device(self.device).type != "cpu":
+            raise ValueError("Hogwild training only supports the CPU.")
+        if not self.model.node_embeddings.sparse:
+            warnings.warn(
+                "Hogwild training with dense gradients writes the whole embedding "
+                "table on every step. Use `Node2Vec(..., sparse=True)` instead."
+            )
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.poll_interval = poll_interval
+
+    def _get_result(self):
+        """Waits for the next result of a worker.
+        Raises if a worker has failed or is not running any more."""
+        while True:
+            try:
+                result = self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                for rank, worker in enumerate(self._workers):
+                    if not worker.is_alive():
+                        raise RuntimeError(
+                            f"Hogwild worker {rank} exited unexpectedly "
+                            f"with exit code {worker.exitcode}."
+                        )
+                continue
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+    def _train_one_epoch(self, eid: int, loader: Optional[DataLoader] = None):
+        """
+        Performs the random walks of one epoch (unless `loader` is given)
+        and trains the workers on disjoint shards of the shuffled windows.
+        """
+        if loader is None:
+            loader = self._get_random_walk()
+
+        walks = loader.dataset
+        order = torch.randperm(len(walks))
+        for rank, tasks in enumerate(self._tasks):
+            # gather the shard into one contiguous tensor, which is sent to
+            # the worker through shared memory
+            tasks.put(walks[order[rank :: self.n_workers]])
+
+        tot_loss, n_batches = 0, 0
+        for _ in self._tasks:
+            result = self._get_result()
+            tot_loss += result[0]
+            n_batches += result[1]
+
+        avg_loss = tot_loss / max(n_batches, 1)
+        print(f"Epoch: {eid:2d}, Loss: {avg_loss:.4f}")
+
+    def train(self):
+        """Train the model for `n_epochs` epochs with `n_workers` processes."""
+
+        self.model.train()
+        self.model.share_memory()
+
+        # fork the workers before the walks (and a prefetch thread) start,
+        # each with its own random seed for the negative samples
+        ctx = mp.get_context("fork")
+        self._tasks = [ctx.SimpleQueue() for _ in range(self.n_workers)]
+        self._results = ctx.Queue()
+        seeds = torch.randint(2**31 - 1, (self.n_workers,)).tolist()
+        self._workers = [
+            ctx.Process(
+                target=_hogwild_worker,
+                args=(self, seed, tasks, self._results),
+                daemon=True,
+            )
+            for seed, tasks in zip(seeds, self._tasks)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        try:
+            super().train()
+        finally:
+            for tasks in self._tasks:
+                tasks.put(None)
+            for worker in self._workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
@@ -1,14 +1,20 @@
+import os
 import torch
+import shutil
+import tempfile
+from functools import partial
 import torch.nn as nn
-from torch.utils.data import DataLoader
 from argparse import ArgumentParser
 
 from metrics import calc_auc_score
-from walker import BiasedRandomWalker
-from node2vec_trainer import Node2VecTrainer
+from walker import BiasedRandomWalker, RejectionSamplingWalker
+from batch_walker import CSRAdjacency, ParallelRandomWalker
+from node2vec_trainer import Node2VecTrainer, HogwildNode2VecTrainer
 from model import Node2Vec, SigmoidPredictionHead
-from data_utils import LinkPredictionDataset, LinkPredictionCollator
-from typing import List, Dict, Tuple
+from loss import FusedNegativeSamplingLoss
+from link_index import ExactLinkIndex, IVFPQLinkIndex
+from data_utils import LinkPredictionDataset
+from typing import List, Dict, Tuple, Optional
 
 from liblgraph_python_api import Galaxy
 
@@ -41,6 +47,25 @@ def parse_args():
         type=str,
         default="/root/ai3602/p3_LinkPrediction/p3_data/label_reference.csv",
     )
+    parser.add_argument(
+        "--recommend_k",
+        type=int,
+        default=0,
+        help="If positive, also writes the top-k new links of every node "
+        "to --recommend_csv_path",
+    )
+    parser.add_argument(
+        "--recommend_csv_path",
+        type=str,
+        default="/root/ai3602/p3_LinkPrediction/p3_data/p3_recommendations.csv",
+    )
+    parser.add_argument(
+        "--recommend_index",
+        type=str,
+        default="exact",
+        choices=["exact", "ivfpq"],
+        help="Exact blocked search, or approximate IVF/PQ search for large graphs",
+    )
 
     parser.add_argument(
         "--epochs", type=int, default=3, help="Number of trainging epochs"
@@ -54,6 +79,11 @@ def parse_args():
     parser.add_argument(
         "--lr", type=float, default=1e-2, help="Learning rate for the Node2Vec model"
     )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Use sparse embedding gradients with the SparseAdam optimizer",
+    )
     parser.add_argument(
         "--window_size", type=int, default=5, help="Window size for Node2Vec"
     )
@@ -78,6 +108,64 @@ def parse_args():
         default=1.0,
         help="Parameter controlling the probability of visiting further neighbor nodes",
     )
+    parser.add_argument(
+        "--walker",
+        type=str,
+        default="biased",
+        choices=["biased", "rejection", "batched"],
+        help="Random walker: alias tables (biased), table-free rejection sampling, "
+        "or vectorized walks over a CSR snapshot of the graph (batched)",
+    )
+    parser.add_argument(
+        "--csr_snapshot",
+        type=str,
+        default=None,
+        help="Directory of the CSR snapshot used by the batched walker. "
+        "Created from the db on the first run and memory-mapped afterwards",
+    )
+    parser.add_argument(
+        "--walk_workers",
+        type=int,
+        default=1,
+        help="Number of processes generating the batched walks",
+    )
+    parser.add_argument(
+        "--prefetch_epochs",
+        type=int,
+        default=0,
+        help="Number of epochs of walks generated in the background during training",
+    )
+    parser.add_argument(
+        "--train_workers",
+        type=int,
+        default=1,
+        help="Number of Hogwild training processes, best used with --sparse",
+    )
+    parser.add_argument(
+        "--neg_sampling",
+        type=str,
+        default="uniform",
+        choices=["uniform", "degree", "walk"],
+        help="Draw negatives uniformly, or by node degree (in + out) "
+        "or walk frequency raised to the power of 0.75",
+    )
+    parser.add_argument(
+        "--reject_neg_contexts",
+        action="store_true",
+        help="Redraw negative samples that are nodes of their own window",
+    )
+    parser.add_argument(
+        "--skip_gram",
+        action="store_true",
+        help="Train on every (center, context) pair in a window, "
+        "not only on the pairs of its first node",
+    )
+    parser.add_argument(
+        "--fused_loss",
+        action="store_true",
+        help="Use the fused negative sampling loss with a hand-written backward",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
 
     return parser.parse_args()
 
@@ -100,22 +188,36 @@ def load_test_data(path: str) -> List[Tuple[int, int]]:
 def predict(
     model: Node2Vec,
     classifier: nn.Module,
-    test_loader: DataLoader,
+    src: torch.Tensor,
+    dst: torch.Tensor,
     device: torch.device,
-) -> List[int]:
-    """Predicts the link probability for each test sample."""
-    predictions = []
-    for src, dst, _ in test_loader:
-        src = src.to(device)
-        dst = dst.to(device)
+    chunk_size: int = 1 << 16,
+) -> List[float]:
+    """Predicts the link probability for each test pair `src[i] -> dst[i]`.
+
+    The pairs are scored in chunks of `chunk_size`, each with one embedding gather
+    per side and one row-wise dot product, without tracking gradients.
+    """
+    model.eval()
+    scores = torch.empty(len(src))
+    with torch.inference_mode():
+        for lo in range(0, len(src), chunk_size):
+            hi = lo + chunk_size
+            src_emb = model(src[lo:hi].to(device))
+            dst_emb = model(dst[lo:hi].to(device))
+            scores[lo:hi] = classifier(src_emb, dst_emb).cpu()
 
-        src_emb = model(src)
-        dst_emb = model(dst)
-        pred = classifier(src_emb, dst_emb)
+    return scores.tolist()
 
-        predictions.extend(pred.tolist())
 
-    return predictions
+def write_recommendations(path: str, scores: torch.Tensor, ids: torch.Tensor):
+    """Writes the top-k new links of each node as `src,rank,dst,score` rows."""
+    with open(path, "w", encoding="utf-8") as fo:
+        fo.write("src,rank,dst,score\n")
+        for src, (row_scores, row_ids) in enumerate(zip(scores.tolist(), ids.tolist())):
+            for rank, (score, dst) in enumerate(zip(row_scores, row_ids)):
+                if dst >= 0:
+                    fo.write(f"{src},{rank},{dst},{score:.4f}\n")
 
 
 def write_results(output_csv_path: str, predictions: List[int]):
@@ -145,9 +247,24 @@ def load_results(result_csv_path: str) -> Dict[int, float]:
     return results
 
 
-def train_node2vec(db, model, device, args):
+def load_csr_adjacency(db, snapshot_path: Optional[str] = None) -> CSRAdjacency:
+    """Loads the CSR snapshot at `snapshot_path`, or reads the graph from the db
+    (and saves the snapshot there, if a path is given)."""
+    if snapshot_path is not None and os.path.exists(snapshot_path):
+        return CSRAdjacency.load(snapshot_path)
+
+    adj = CSRAdjacency.from_tugraph(db)
+    if snapshot_path is not None:
+        adj.save(snapshot_path)
+    return adj
+
+
+def train_node2vec(db, model, device, args) -> Optional[CSRAdjacency]:
     """
     Trains the Node2Vec model with the given arguments.
+
+    Returns the CSR snapshot of the graph if one was loaded for training,
+    so that it is not read from the db again, `None` otherwise.
     """
 
     N_EPOCHS = args.epochs
@@ -163,20 +280,64 @@ def train_node2vec(db, model, device, args):
     NUM_NODES = 16863
 
     # training Node2Vec
-    walker = BiasedRandomWalker(db, RETURN_PARAM_P, IO_PARAM_Q)
-    node2vec_trainer = Node2VecTrainer(
-        NUM_NODES,
-        model,
-        walker,
-        N_NEG_SAMPLES,
-        N_EPOCHS,
-        BATCH_SIZE,
-        LEARNING_RATE,
-        device,
-        WALK_LENGTH,
-        WINDOW_SIZE,
-    )
-    node2vec_trainer.train()
+    tmp_dir = None
+    adj = None  # CSR snapshot of the graph, read from the db at most once
+    if args.walker == "rejection":
+        walker = RejectionSamplingWalker(db, RETURN_PARAM_P, IO_PARAM_Q)
+    elif args.walker == "batched":
+        # the workers share the graph through a memory-mapped snapshot.
+        # With 1 worker, the walks are generated in-process with the same
+        # per-chunk seeds, so they do not depend on the number of workers.
+        snapshot_path = args.csr_snapshot
+        if snapshot_path is None:
+            tmp_dir = tempfile.mkdtemp()
+            snapshot_path = os.path.join(tmp_dir, "csr")
+        adj = load_csr_adjacency(db, snapshot_path)
+        walker = ParallelRandomWalker(
+            snapshot_path,
+            RETURN_PARAM_P,
+            IO_PARAM_Q,
+            seed=args.seed,
+            n_workers=args.walk_workers,
+        )
+    else:
+        walker = BiasedRandomWalker(db, RETURN_PARAM_P, IO_PARAM_Q)
+    try:
+        if args.train_workers > 1:
+            trainer_cls = partial(HogwildNode2VecTrainer, n_workers=args.train_workers)
+        else:
+            trainer_cls = Node2VecTrainer
+        node2vec_trainer = trainer_cls(
+            NUM_NODES,
+            model,
+            walker,
+            N_NEG_SAMPLES,
+            N_EPOCHS,
+            BATCH_SIZE,
+            LEARNING_RATE,
+            device,
+            WALK_LENGTH,
+            WINDOW_SIZE,
+            prefetch_epochs=args.prefetch_epochs,
+            reject_contexts=args.reject_neg_contexts,
+            skip_gram=args.skip_gram,
+            loss_func=FusedNegativeSamplingLoss() if args.fused_loss else None,
+        )
+        if args.neg_sampling == "degree":
+            if adj is None:
+                adj = load_csr_adjacency(db, args.csr_snapshot)
+            node2vec_trainer.set_neg_freqs(torch.from_numpy(adj.total_degrees()))
+        elif args.neg_sampling == "walk":
+            node2vec_trainer.set_neg_freqs(node2vec_trainer.walk_frequencies())
+        node2vec_trainer.train()
+    finally:
+        if isinstance(walker, ParallelRandomWalker):
+            walker.close()
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    if isinstance(walker, BiasedRandomWalker):
+        print(f"Adjacency cache: {walker.adj.stats()}")
+    return adj
 
 
 def main():
@@ -201,27 +362,33 @@ def main():
     db = galaxy.OpenGraph(args.graph_name)
 
     # 1. Train Node2Vec node embeddings
-    model = Node2Vec(NUM_NODES, args.embedding_dim).to(device)
-    train_node2vec(db, model, device, args)
+    model = Node2Vec(NUM_NODES, args.embedding_dim, sparse=args.sparse).to(device)
+    adj = train_node2vec(db, model, device, args)
+    if args.recommend_k > 0 and adj is None:
+        # existing links are excluded from the recommendations
+        adj = load_csr_adjacency(db, args.csr_snapshot)
 
     # done with the graph database
     db.Close()
     galaxy.Close()
 
     # 2. Link Prediction
-    # load test data and make it a dataset
-    test_data = load_test_data(TESTSET_PATH)
-    test_dataset = LinkPredictionDataset(test_data)
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=args.batch_size,
-        shuffle=False,
-        collate_fn=LinkPredictionCollator(),
-    )
+    # load test data and make it a dataset of source and destination tensors
+    test_dataset = LinkPredictionDataset(load_test_data(TESTSET_PATH))
 
     # We directly use a dot-product + sigmoid to predict the link probability.
     classifier = SigmoidPredictionHead().to(device)
-    predictions = predict(model, classifier, test_loader, device)
+    predictions = predict(model, classifier, test_dataset.src, test_dataset.dst, device)
+
+    if args.recommend_k > 0:
+        embeddings = model.node_embeddings.weight.cpu()
+        if args.recommend_index == "ivfpq":
+            index = IVFPQLinkIndex(embeddings, adj)
+        else:
+            index = ExactLinkIndex(embeddings, adj)
+        scores, ids = index.query_all(args.recommend_k)
+        write_recommendations(args.recommend_csv_path, torch.sigmoid(scores), ids)
+        print(f"Recommendations written to {args.recommend_csv_path}")
 
     # 3. Write results and compute auc scores on the validation set
     # write prediction results to output_csv_path
@@ -0,0 +1,227 @@
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+import torch
+
+from alias import AliasSampler, AliasTable, build_alias_table
+from batch_walker import BatchedRandomWalker, CSRAdjacency, ParallelRandomWalker
+from data_utils import WalkWindowDataset
+from link_index import ExactLinkIndex, IVFPQLinkIndex
+from loss import FusedNegativeSamplingLoss, _FusedNegativeSampling
+from model import Node2Vec
+from node2vec_trainer import HogwildNode2VecTrainer
+
+
+def _get_adjacency(num_nodes: int = 200, n_edges: int = 1000, seed: int = 0):
+    """A random directed graph, in which some nodes have no out-edges."""
+    rng = np.random.default_rng(seed)
+    src = rng.integers(0, num_nodes - 10, n_edges)
+    dst = rng.integers(0, num_nodes, n_edges)
+    edges = np.unique(np.stack([src, dst], axis=1), axis=0)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=num_nodes), out=indptr[1:])
+    return CSRAdjacency(indptr, edges[:, 1].copy())
+
+
+class TestAlias(unittest.TestCase):
+    def test_build_alias_table(self):
+        # the probability of item i is its own column plus what other columns alias
+        probs = [0.1, 0.5, 0.0, 0.15, 0.25]
+        accept, alias = build_alias_table(probs)
+        mass = list(accept)
+        for col, p in enumerate(accept):
+            mass[alias[col]] += 1 - p
+        for i, p in enumerate(probs):
+            self.assertAlmostEqual(mass[i] / len(probs), p)
+
+    def test_alias_table(self):
+        random.seed(0)
+        table = AliasTable([10, 11, 12], [1.0, 2.0, 7.0])
+        draws = [table.draw() for _ in range(100000)]
+        for item, p in [(10, 0.1), (11, 0.2), (12, 0.7)]:
+            self.assertAlmostEqual(draws.count(item) / len(draws), p, delta=0.01)
+
+    def test_alias_sampler(self):
+        torch.manual_seed(0)
+        weights = torch.tensor([4.0, 0.0, 1.0, 3.0, 2.0])
+        sampler = AliasSampler(weights)
+        draws = sampler.sample((200, 500))
+        self.assertEqual(draws.shape, (200, 500))
+        freqs = torch.bincount(draws.flatten(), minlength=len(weights)).double()
+        # nodes with zero weight are never drawn
+        self.assertEqual(freqs[1], 0)
+        expected = weights.double() / weights.sum()
+        self.assertTrue(torch.allclose(freqs / draws.numel(), expected, atol=0.01))
+
+
+class TestRandomWalker(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.adj = _get_adjacency()
+
+    def _assert_valid_walks(self, walks: np.ndarray):
+        for walk in walks.tolist():
+            for curr, nxt in zip(walk[:-1], walk[1:]):
+                if self.adj.degrees[curr] == 0:
+                    # dead ends stay where they are
+                    self.assertEqual(nxt, curr)
+                else:
+                    self.assertIn(nxt, self.adj.neighbors(curr))
+
+    def test_batched_walker(self):
+        walker = BatchedRandomWalker(self.adj, p=0.5, q=2.0, seed=0)
+        walks = walker.walk_batch(range(self.adj.num_nodes), 12)
+        self.assertEqual(walks.shape, (self.adj.num_nodes, 12))
+        self.assertEqual(walks[:, 0].tolist(), list(range(self.adj.num_nodes)))
+        self._assert_valid_walks(walks)
+
+    def test_parallel_walker(self):
+        # the walks do not depend on the number of workers
+        starts = np.tile(np.arange(self.adj.num_nodes), 3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot_path = os.path.join(tmp_dir, "csr")
+            self.adj.save(snapshot_path)
+            results = []
+            for n_workers in [1, 2]:
+                walker = ParallelRandomWalker(
+                    snapshot_path, 0.5, 2.0, seed=1, n_workers=n_workers, chunk_size=64
+                )
+                try:
+                    # two calls, so that the second one reuses the pool
+                    results.append([walker.walk_batch(starts, 10) for _ in range(2)])
+                finally:
+                    walker.close()
+
+        for single, multi in zip(*results):
+            self.assertTrue(np.array_equal(single, multi))
+            self._assert_valid_walks(multi)
+        # every call draws new walks
+        self.assertFalse(np.array_equal(results[0][0], results[0][1]))
+
+
+class TestWalkWindowDataset(unittest.TestCase):
+    def test_windows(self):
+        trajectories = torch.arange(12).view(2, 6)
+        dataset = WalkWindowDataset(trajectories, window_size=3)
+        self.assertEqual(len(dataset), 2 * 4)
+        self.assertEqual(dataset[0].tolist(), [0, 1, 2])
+        self.assertEqual(dataset[5].tolist(), [7, 8, 9])
+        batch = dataset[torch.tensor([3, 4])]
+        self.assertEqual(batch.tolist(), [[3, 4, 5], [6, 7, 8]])
+
+
+class TestFusedNegativeSampling(unittest.TestCase):
+    def test_gradcheck(self):
+        torch.manual_seed(0)
+        inputs = (
+            torch.randn(3, 4, dtype=torch.double, requires_grad=True),
+            torch.randn(3, 2, 4, dtype=torch.double, requires_grad=True),
+            torch.randn(3, 5, 4, dtype=torch.double, requires_grad=True),
+        )
+        self.assertTrue(torch.autograd.gradcheck(_FusedNegativeSampling.apply, inputs))
+
+    def test_large_scores(self):
+        # scores of +-1e4 saturate the sigmoids, but the loss stays finite
+        cur = torch.full((2, 4), 50.0, requires_grad=True)
+        pos = torch.full((2 * 3, 4), -50.0)
+        neg = torch.full((2 * 6, 4), 50.0)
+        loss = FusedNegativeSamplingLoss()(cur, pos, neg)
+        loss.backward()
+        self.assertTrue(torch.isfinite(loss))
+        self.assertTrue(torch.isfinite(cur.grad).all())
+
+
+class TestLinkIndex(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.adj = _get_adjacency()
+        self.embeddings = torch.randn(
+            self.adj.num_nodes, 16, generator=torch.Generator().manual_seed(0)
+        )
+
+    def _brute_force(self, nodes: torch.Tensor, k: int):
+        scores = self.embeddings[nodes] @ self.embeddings.T
+        for row, node in enumerate(nodes.tolist()):
+            scores[row, node] = -float("inf")
+            scores[row, self.adj.neighbors(node)] = -float("inf")
+        return scores.topk(k, dim=1)
+
+    def test_exact(self):
+        nodes = torch.arange(0, self.adj.num_nodes, 3)
+        index = ExactLinkIndex(self.embeddings, self.adj, block_size=16)
+        scores, ids = index.query(nodes, 10)
+        expected_scores, expected_ids = self._brute_force(nodes, 10)
+        self.assertTrue(torch.allclose(scores, expected_scores))
+        self.assertTrue(torch.equal(ids, expected_ids))
+
+    def test_exact_few_candidates(self):
+        # node 0 links to all nodes but 4, so 4 is its only candidate
+        adj = CSRAdjacency(np.array([0, 3, 3, 3, 3, 3]), np.array([1, 2, 3]))
+        index = ExactLinkIndex(self.embeddings[:5], adj)
+        scores, ids = index.query([0], 3)
+        self.assertEqual(ids.tolist(), [[4, -1, -1]])
+        self.assertEqual(scores[0, 1:].tolist(), [-float("inf")] * 2)
+
+    def test_ivfpq(self):
+        # probing every list and re-scoring every candidate is exact search
+        nodes = torch.arange(0, self.adj.num_nodes, 3)
+        index = IVFPQLinkIndex(
+            self.embeddings, self.adj, n_lists=8, n_probe=8, refine_factor=20
+        )
+        scores, ids = index.query(nodes, 10)
+        expected_scores, expected_ids = self._brute_force(nodes, 10)
+        self.assertTrue(torch.allclose(scores, expected_scores))
+        self.assertTrue(torch.equal(ids, expected_ids))
+
+
+class TestHogwild(unittest.TestCase):
+    def __init__(self, methodName: str = "runTest") -> None:
+        super().__init__(methodName)
+        self.adj = _get_adjacency()
+
+    def _get_trainer(self):
+        num_nodes = self.adj.num_nodes
+        return HogwildNode2VecTrainer(
+            num_nodes,
+            Node2Vec(num_nodes, 8, sparse=True),
+            BatchedRandomWalker(self.adj, seed=0),
+            n_negs=2,
+            n_epochs=2,
+            batch_size=32,
+            lr=0.01,
+            device=torch.device("cpu"),
+            walk_length=8,
+            window_size=3,
+            loss_func=FusedNegativeSamplingLoss(),
+            n_workers=2,
+            poll_interval=0.1,
+        )
+
+    def test_train(self):
+        trainer = self._get_trainer()
+        before = trainer.model.node_embeddings.weight.detach().clone()
+        trainer.train()
+        self.assertFalse(torch.equal(before, trainer.model.node_embeddings.weight))
+
+    def test_worker_raises(self):
+        trainer = self._get_trainer()
+
+        def fail(batch):
+            raise KeyError("boom")
+
+        # the workers are forked, so they inherit the patched step
+        trainer._train_step = fail
+        with self.assertRaisesRegex(RuntimeError, "KeyError: 'boom'"):
+            trainer.train()
+
+    def test_worker_dies(self):
+        trainer = self._get_trainer()
+        trainer._train_step = lambda batch: os._exit(3)
+        with self.assertRaisesRegex(RuntimeError, "exit code 3"):
+            trainer.train()
+
+
+if __name__ == "__main__":
+    unittest.main()
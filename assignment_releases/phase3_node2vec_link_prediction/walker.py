@@ -1,5 +1,7 @@
 import random
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+from alias import AliasTable
+from adjacency_cache import AdjacencyCache
 
 
 class BiasedRandomWalker:
@@ -10,13 +12,23 @@ class BiasedRandomWalker:
     - db: A TuGraph database instance.
     - p (float, optional): The return parameter. Defaults to 1.2.
     - q (float, optional): The in-out parameter. Defaults to 2.0.
+    - cache_size (int, optional): Maximum number of vertex ids kept in the
+      adjacency cache `self.adj`. Defaults to 2^22. Set to 0 to disable caching.
     """
 
-    def __init__(self, db, p: float = 1.2, q: float = 2.0):
+    def __init__(self, db, p: float = 1.2, q: float = 2.0, cache_size: int = 1 << 22):
         self.db = db
         self.ret_p = p
         self.io_q = q
 
+        # neighbor lists read from TuGraph are memoized across walks
+        self.adj = AdjacencyCache(max_ids=cache_size)
+
+        # lazily built alias tables of the biased transition probabilities
+        # (prev, curr) -> table of the biased step
+        # NOTE: these take O(sum of deg^2) memory once all edges are visited
+        self._biased_tables: Dict[Tuple[int, int], AliasTable] = {}
+
         self.connected_nodes = self._get_connected_nodes()
 
     def _get_connected_nodes(self):
@@ -109,6 +121,22 @@ class BiasedRandomWalker:
         probs = self._normalize(unnormalized_probs)
         return nexts, probs
 
+    def sample_uniform(self, txn, vit) -> int:
+        """Samples the next node uniformly, as `get_probs_uniform`, in O(1)
+        from the cached neighbor list of the current node."""
+        nbrs = self.adj.attach(txn).out_neighbors(vit.GetId())
+        return nbrs[int(random.random() * len(nbrs))]
+
+    def sample_biased(self, txn, vit, prev: int) -> int:
+        """Samples the next node from `get_probs_biased` in O(1),
+        using an alias table that is built once per (prev, curr) and then cached."""
+        key = (prev, vit.GetId())
+        table = self._biased_tables.get(key)
+        if table is None:
+            nexts, probs = self.get_probs_biased(txn, vit, prev)
+            table = self._biased_tables[key] = AliasTable(nexts, probs)
+        return table.draw()
+
     def walk(self, start: int, length: int) -> List[int]:
         """Perform a random walk of length `length`, starting from node `start`.
 
@@ -120,8 +148,9 @@ class BiasedRandomWalker:
             List[int]: A list of node ids representing the random walk trajectory.
         """
 
-        # initiate a transaction
+        # initiate a transaction, cached neighbor lists are read through it
         txn = self.db.CreateReadTxn()
+        self.adj.attach(txn)
         # get a vertex iterator pointing to the start node
         vit = txn.GetVertexIterator(start)
 
@@ -139,6 +168,8 @@ class BiasedRandomWalker:
             #    Use `get_probs_uniform`, which we have provided for you.
             # 2. For the subsequent nodes, sample based on the biased probabilities.
             #    Use `get_probs_biased`, which you have just implemented.
+            # 3. `sample_uniform` and `sample_biased` draw from these two
+            #    distributions in O(1) per step with cached alias tables.
 
             ##################
             # Your Code Here #
@@ -155,4 +186,84 @@ class BiasedRandomWalker:
             current_len += 1
 
         txn.Commit()
+        # do not read through the committed transaction any more
+        self.adj.attach(None)
+        return trace
+
+
+class RejectionSamplingWalker(BiasedRandomWalker):
+    """
+    A node2vec random walker that samples transitions by rejection,
+    without any per-node or per-edge probability tables.
+
+    Each step proposes a neighbor of the current node uniformly at random,
+    and accepts it with probability proportional to its unnormalized weight
+    (1/p to return to `prev`, 1 to stay close to `prev`, 1/q to move away).
+    The accepted samples follow exactly the node2vec transition probabilities.
+
+    Apart from the cached (sorted) neighbor arrays, which take O(|E|) memory,
+    nothing is precomputed, so this walker scales to graphs where second-order
+    alias tables (O(sum of deg^2)) would not fit in memory.
+
+    Args:
+    - db: A TuGraph database instance.
+    - p (float, optional): The return parameter. Defaults to 1.2.
+    - q (float, optional): The in-out parameter. Defaults to 2.0.
+    - cache_size (int, optional): Maximum number of vertex ids kept in the
+      adjacency cache. Defaults to 2^22, set it to at least |E| + |V| to read
+      each neighbor list from TuGraph only once.
+    """
+
+    def __init__(self, db, p: float = 1.2, q: float = 2.0, cache_size: int = 1 << 22):
+        super().__init__(db, p, q, cache_size)
+
+        # unnormalized weights of the three kinds of transitions
+        self._w_return = 1 / self.ret_p
+        self._w_inout = 1 / self.io_q
+        self._w_max = max(self._w_return, 1.0, self._w_inout)
+
+    def _sample_next(self, prev: int, curr: int) -> int:
+        """Samples the node after `curr` given the previous node `prev`."""
+        nbrs = self.adj.out_neighbors(curr)
+        while True:
+            target = nbrs[int(random.random() * len(nbrs))]
+            if target == prev:
+                weight = self._w_return
+            elif self.adj.has_edge(prev, target):
+                weight = 1.0
+            else:
+                weight = self._w_inout
+            if random.random() * self._w_max < weight:
+                return target
+
+    def walk(self, start: int, length: int) -> List[int]:
+        """Perform a random walk of length `length`, starting from node `start`.
+
+        Args:
+            start (int): The node id to start the random walk.
+            length (int): The length of the random walk.
+
+        Returns:
+            List[int]: A list of node ids representing the random walk trajectory.
+                A walk that reaches a node without out-edges stays there,
+                as in `BatchedRandomWalker`, so all walks have length `length`.
+        """
+        txn = self.db.CreateReadTxn()
+        self.adj.attach(txn)
+
+        trace = [start]
+        while len(trace) < length:
+            curr = trace[-1]
+            nbrs = self.adj.out_neighbors(curr)
+            if len(nbrs) == 0:
+                trace.append(curr)
+            elif len(trace) == 1:
+                # no previous node for the first step, sample uniformly
+                trace.append(nbrs[int(random.random() * len(nbrs))])
+            else:
+                trace.append(self._sample_next(trace[-2], curr))
+
+        txn.Commit()
+        # do not read through the committed transaction any more
+        self.adj.attach(None)
         return trace